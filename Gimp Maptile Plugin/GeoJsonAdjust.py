@@ -1,5 +1,30 @@
+import os
+import re
 import json
+import math
 import argparse
+import textwrap
+import numpy as np
+
+try:
+    import ijson  # type: ignore
+except ImportError:
+    ijson = None
+
+# Raised by iter_features for a file that is not valid JSON, with or without ijson.
+JSON_ERRORS = (json.JSONDecodeError,) + ((ijson.JSONError,) if ijson is not None else ())
+
+TAG_PATTERN = re.compile(r"<[^>]+>")
+
+# Nesting depth of the position arrays for each geometry type.
+COORDINATE_DEPTH = {
+    "Point": 0,
+    "MultiPoint": 1,
+    "LineString": 1,
+    "MultiLineString": 2,
+    "Polygon": 2,
+    "MultiPolygon": 3,
+}
 
 
 def offset_coords(coords, dx, dy):
@@ -105,6 +130,280 @@ def offset_geojson(data, dx, dy):
     return data
 
 
+def affine_matrix(dx=0.0, dy=0.0, scale=1.0, rotation=0.0, center=(0.0, 0.0)):
+    """
+    Build a 2x3 affine matrix that scales by `scale` and rotates by `rotation`
+    degrees (counter-clockwise, as +Y is north) about `center`, then offsets by (dx, dy).
+    For data from the SVG-center script the map center is (0, 0).
+    """
+    cx, cy = center
+    theta = math.radians(rotation)
+    a = scale * math.cos(theta)
+    b = -scale * math.sin(theta)
+    d = scale * math.sin(theta)
+    e = scale * math.cos(theta)
+    return np.array([
+        [a, b, cx - a * cx - b * cy + dx],
+        [d, e, cy - d * cx - e * cy + dy],
+    ])
+
+
+def _leaf_lists(coords, depth):
+    """Yield each innermost list of positions in a coordinates array."""
+    if depth <= 1:
+        yield coords
+    else:
+        for part in coords:
+            yield from _leaf_lists(part, depth - 1)
+
+
+def _rebuild(coords, depth, leaves):
+    """Rebuild a coordinates array of the given depth from transformed leaf lists."""
+    if depth <= 1:
+        return next(leaves)
+    return [_rebuild(part, depth - 1, leaves) for part in coords]
+
+
+def transform_positions(positions, matrix):
+    """
+    Apply an affine matrix to an (N, 2+) array of positions.
+    Any Z or measure values beyond the first two columns are kept unchanged.
+    """
+    result = np.array(positions, dtype=float)
+    xy = result[:, :2]
+    result[:, :2] = xy @ matrix[:, :2].T + matrix[:, 2]
+    return result
+
+
+def transform_geometry(geometry, matrix):
+    """
+    Apply an affine matrix to every coordinate of a GeoJSON geometry.
+    All positions of a geometry are transformed together as one NumPy array.
+    """
+    if geometry is None:
+        return None
+
+    gtype = geometry.get("type")
+
+    if gtype == "GeometryCollection":
+        geometry["geometries"] = [
+            transform_geometry(geom, matrix) for geom in geometry.get("geometries", [])
+        ]
+        return geometry
+
+    depth = COORDINATE_DEPTH.get(gtype)
+    coords = geometry.get("coordinates")
+    if depth is None or not coords:
+        # Unknown or empty type; leave as-is
+        return geometry
+
+    if depth == 0:
+        geometry["coordinates"] = transform_positions([coords], matrix)[0].tolist()
+        return geometry
+
+    leaves = list(_leaf_lists(coords, depth))
+
+    if all(len(p) == 2 for leaf in leaves for p in leaf):
+        # Transform every position of the geometry as one stacked array.
+        sizes = np.cumsum([len(leaf) for leaf in leaves])[:-1]
+        stacked = np.concatenate([np.asarray(leaf, dtype=float).reshape(-1, 2) for leaf in leaves])
+        transformed = [part.tolist() for part in np.split(transform_positions(stacked, matrix), sizes)]
+    else:
+        # Positions carry extra (possibly uneven) dimensions; transform one at a time.
+        transformed = [
+            [transform_positions([p], matrix)[0].tolist() for p in leaf]
+            for leaf in leaves
+        ]
+
+    geometry["coordinates"] = _rebuild(coords, depth, iter(transformed))
+    return geometry
+
+
+def transform_feature(feature, matrix):
+    """Apply an affine matrix to the geometry of a single Feature."""
+    if feature.get("type") != "Feature":
+        return feature
+
+    geom = feature.get("geometry")
+    if geom:
+        feature["geometry"] = transform_geometry(geom, matrix)
+    return feature
+
+
+def transform_geojson(data, matrix):
+    """
+    Apply an affine matrix to all geometries in a GeoJSON object.
+    Handles the same object types as offset_geojson.
+    """
+    dtype = data.get("type")
+
+    if dtype == "FeatureCollection":
+        data["features"] = [
+            transform_feature(f, matrix) for f in data.get("features", [])
+        ]
+
+    elif dtype == "Feature":
+        data = transform_feature(data, matrix)
+
+    else:
+        data = transform_geometry(data, matrix)
+
+    return data
+
+
+def geometry_bbox(geometry):
+    """
+    Return [min_x, min_y, max_x, max_y] of a GeoJSON geometry, or None if it
+    has no coordinates.
+    """
+    if not geometry:
+        return None
+
+    gtype = geometry.get("type")
+
+    if gtype == "GeometryCollection":
+        boxes = [b for b in (geometry_bbox(g) for g in geometry.get("geometries", [])) if b]
+        if not boxes:
+            return None
+        boxes = np.array(boxes)
+        return [*boxes[:, :2].min(axis=0).tolist(), *boxes[:, 2:].max(axis=0).tolist()]
+
+    depth = COORDINATE_DEPTH.get(gtype)
+    coords = geometry.get("coordinates")
+    if depth is None or not coords:
+        return None
+
+    if depth == 0:
+        return [coords[0], coords[1], coords[0], coords[1]]
+
+    xy = [p[:2] for leaf in _leaf_lists(coords, depth) for p in leaf]
+    if not xy:
+        return None
+    xy = np.array(xy, dtype=float)
+    return [*xy.min(axis=0).tolist(), *xy.max(axis=0).tolist()]
+
+
+def feature_name(properties, default=""):
+    """
+    Best-effort display name for a feature: a "name" property if present,
+    otherwise the first line of its popup-text with the HTML tags removed.
+    """
+    name = properties.get("name")
+    if name:
+        return name
+
+    text = properties.get("popup-text", "")
+    # Popups are "<strong>Name</strong><br>Description"; keep only the title.
+    text = re.split(r"<br\s*/?>", text, maxsplit=1)[0]
+    text = TAG_PATTERN.sub("", text).strip()
+    return text or default
+
+
+def iter_features(geojson_file):
+    """
+    Yield the Features of a FeatureCollection file one at a time.
+    Uses ijson to stream the file when it is installed; otherwise the whole
+    document is loaded with json.load. A file that is not valid JSON raises
+    one of JSON_ERRORS.
+    """
+    if ijson is None:
+        with open(geojson_file, "r") as f:
+            yield from json.load(f).get("features", [])
+        return
+
+    with open(geojson_file, "rb") as f:
+        yield from ijson.items(f, "features.item", use_float=True)
+
+
+def merge_bbox(a, b):
+    """Return the bbox covering both a and b; either may be None."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+
+class FeatureCollectionWriter:
+    """
+    Write Features to a FeatureCollection file one at a time, using the same
+    layout as json.dump(..., indent=2).
+
+    With compact=True each feature is written on a single line without padding.
+    With bbox=True a "bbox" member is added to each feature, and the bbox of
+    the whole collection is written after the features once it is known.
+
+    Features go to a temporary file that only replaces geojson_file once
+    close() finishes the collection. Used as a context manager, an exception
+    discards the temporary file, so a failed run never leaves a truncated
+    but valid-looking collection behind.
+    """
+
+    def __init__(self, geojson_file, compact=False, bbox=False):
+        self.path = geojson_file
+        self.file = open(geojson_file + ".tmp", "w")
+        self.compact = compact
+        self.add_bbox = bbox
+        self.bbox = None
+        self.count = 0
+        self.file.write('{\n  "type": "FeatureCollection",\n  "features": [')
+
+    def write(self, feature):
+        if self.add_bbox:
+            box = geometry_bbox(feature.get("geometry"))
+            if box is not None:
+                feature["bbox"] = box
+                self.bbox = merge_bbox(self.bbox, box)
+
+        self.file.write(",\n" if self.count else "\n")
+        if self.compact:
+            self.file.write(json.dumps(feature, separators=(",", ":")))
+        else:
+            self.file.write(textwrap.indent(json.dumps(feature, indent=2), "    "))
+        self.count += 1
+
+    def close(self):
+        self.file.write("\n  ]")
+        if self.add_bbox and self.bbox is not None:
+            self.file.write(',\n  "bbox": ' + json.dumps(self.bbox))
+        self.file.write("\n}")
+        self.file.close()
+        os.replace(self.path + ".tmp", self.path)
+
+    def abort(self):
+        """Discard everything written, leaving any previous geojson_file untouched."""
+        self.file.close()
+        os.remove(self.path + ".tmp")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_feature_collection(features, geojson_file, compact=False, bbox=False):
+    """
+    Write an iterable of Features as a FeatureCollection, one feature at a time.
+    See FeatureCollectionWriter for the options.
+    """
+    with FeatureCollectionWriter(geojson_file, compact=compact, bbox=bbox) as writer:
+        for feature in features:
+            writer.write(feature)
+
+
+def transform_geojson_streaming(input_geojson, output_geojson, matrix):
+    """
+    Stream the features of a FeatureCollection from input to output,
+    transforming each one, without holding the whole document in memory.
+    """
+    features = (transform_feature(f, matrix) for f in iter_features(input_geojson))
+    write_feature_collection(features, output_geojson)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description=(
@@ -113,7 +412,9 @@ def main():
             "For data from the SVG-center script:\n"
             "  +offset-x = east/right\n"
             "  +offset-y = north/up\n"
-            "To move shapes south/down by 250 units, use: --offset-y -250"
+            "To move shapes south/down by 250 units, use: --offset-y -250\n\n"
+            "Scale and rotation are applied about the map center first,\n"
+            "then the offset. Rotation is in degrees, counter-clockwise."
         ),
         formatter_class=argparse.RawTextHelpFormatter
     )
@@ -137,12 +438,54 @@ def main():
         help="Offset to add to all Y coordinates (default: 0.0)"
     )
 
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Scale factor applied about the center (default: 1.0)"
+    )
+    parser.add_argument(
+        "--rotate",
+        type=float,
+        default=0.0,
+        help="Rotation in degrees about the center, counter-clockwise (default: 0.0)"
+    )
+    parser.add_argument(
+        "--center-x",
+        type=float,
+        default=0.0,
+        help="X of the scale/rotation center (default: 0.0, the map center)"
+    )
+    parser.add_argument(
+        "--center-y",
+        type=float,
+        default=0.0,
+        help="Y of the scale/rotation center (default: 0.0, the map center)"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help=(
+            "Stream features from input to output instead of loading the whole file.\n"
+            "Input must be a FeatureCollection. Uses ijson when installed."
+        )
+    )
+
     args = parser.parse_args()
 
+    matrix = affine_matrix(
+        args.offset_x, args.offset_y, args.scale, args.rotate,
+        center=(args.center_x, args.center_y)
+    )
+
+    if args.stream:
+        transform_geojson_streaming(args.input_geojson, args.output, matrix)
+        return
+
     with open(args.input_geojson, "r") as f:
         data = json.load(f)
 
-    shifted = offset_geojson(data, args.offset_x, args.offset_y)
+    shifted = transform_geojson(data, matrix)
 
     with open(args.output, "w") as f:
         json.dump(shifted, f, indent=2)
@@ -1,12 +1,12 @@
 #!/usr/bin/env python
 import os
-import time
 import threading
 import traceback
 import hashlib
+import zlib
 import json
 import copy
-from Queue import Queue
+from Queue import Queue, Full
 from gimpfu import *
 
 # Heavily adapted from https://bitbucket.org/zmasek/gimp-leaflet/src/master/README.rst
@@ -23,16 +23,97 @@ ZOOM_DEFAULT = 8
 ZOOM_OPTIONS = (0, 8, 1)
 THREAD_OPTIONS = (1, 8, 1)
 THREADPOOL = 4
+# Seconds the tile producer waits on a full task queue before checking that a worker is still alive.
+QUEUE_WAIT = 1
 FILE_TYPE = ".png"
 
+
 configFile = "config.json"
+journalFile = "config.journal"
+
+# Tile results are appended to the journal as they arrive, and folded into config.json this often.
+JOURNAL_FLUSH_EVERY = 100
+JOURNAL_COMPACT_EVERY = 50000
 
 # Lock for protecting access to the shared dictionary
 lock = threading.Lock()
 
+# GUI progress updates are skipped when tiling from batch mode.
+showProgress = True
+
+def progress_init(text):
+    if showProgress:
+        gimp.progress_init(text)
+
+def progress_text(text):
+    if showProgress:
+        pdb.gimp_progress_set_text(text)
+
+def progress_update(fraction):
+    if showProgress:
+        pdb.gimp_progress_update(fraction)
+
+def progress_end():
+    if showProgress:
+        pdb.gimp_progress_end()
+
+class ScratchImage:
+    """
+    A small BOX x BOX image, reused by one worker for every tile it cuts.
+    Tile pixels are copied into it straight from the zoom master's pixel region,
+    so the cost of a tile does not depend on the size of the map.
+    """
+
+    def __init__(self):
+        self.image = None
+        self.layer = None
+        self.has_alpha = None
+        self.pixels = None
+
+    def create(self, has_alpha):
+        self.delete()
+        self.image = gimp.Image(BOX, BOX, RGB)
+        self.image.disable_undo()
+        layer_type = RGBA_IMAGE if has_alpha else RGB_IMAGE
+        self.layer = gimp.Layer(self.image, "tile", BOX, BOX, layer_type, 100, NORMAL_MODE)
+        self.image.add_layer(self.layer, 0)
+        self.has_alpha = has_alpha
+
+    def load(self, source_layer, offset_x, offset_y):
+        """
+        Copy the BOX x BOX region at (offset_x, offset_y) of source_layer into the scratch image.
+        The raw pixel data copied is kept in self.pixels.
+        """
+        if self.image is None or self.has_alpha != source_layer.has_alpha:
+            self.create(source_layer.has_alpha)
+        elif pdb.gimp_image_base_type(self.image) != RGB:
+            # The previous tile was converted to indexed for saving.
+            pdb.gimp_image_convert_rgb(self.image)
+
+        source = source_layer.get_pixel_rgn(offset_x, offset_y, BOX, BOX, False, False)
+        target = self.layer.get_pixel_rgn(0, 0, BOX, BOX, True, False)
+        self.pixels = source[offset_x:offset_x + BOX, offset_y:offset_y + BOX]
+        target[0:BOX, 0:BOX] = self.pixels
+        self.layer.flush()
+        self.layer.update(0, 0, BOX, BOX)
+        return self.image
+
+    def delete(self):
+        if self.image is not None:
+            pdb.gimp_image_delete(self.image)
+            self.image = None
+            self.layer = None
+
+def raw_hash(pixels):
+    """
+    Fast non-cryptographic hash of raw tile pixels (CRC-32 and Adler-32 together), used to
+    spot unchanged tiles before the costly conversion to indexed color.
+    """
+    return "%08x%08x" % (zlib.crc32(pixels) & 0xffffffff, zlib.adler32(pixels) & 0xffffffff)
+
 class Tile:
     
-    def __init__(self, x, y, z, image, output_dir, existingFiles, previousConfigData, resumeinterrupted):      
+    def __init__(self, x, y, z, image, output_dir, existingFiles, previousConfigData, resumeinterrupted, unchanged=False):      
         self.x = x
         self.y = y
         self.z = z
@@ -40,6 +121,7 @@ class Tile:
         self.status = "Not Done"
         self.output_dir = output_dir
         self.resumeinterrupted = resumeinterrupted
+        self.unchanged = unchanged
         self.existingFiles = existingFiles
         self.previousConfigData = previousConfigData
 
@@ -83,16 +165,21 @@ class Tile:
         # gimp.message(prevMD5)
         return prevMD5
 
-    def create_tile(self):
+    def getPreviousRawHash(self, key):
+        return self.previousConfigData.get("files", {}).get(key, {}).get("rawhash", "DNE")
+
+    def create_tile(self, scratch):
         """
         Create a tile in the calculated coordinates and save it to storage.
+        The tile is cut into the worker's ScratchImage rather than a copy of the zoom master.
         """
         tileResult = {}
         tileResult["key"] = self.uniqueKey()  
         tileResult["filename"] = self.get_output_path()
         
-        # If we're rerunning an interrupted job, and the file exists with a configuration record do no work here.
-        if self.resumeinterrupted and tileResult["filename"] in self.existingFiles and self.uniqueKey() in self.previousConfigData.get("files",{}):
+        # If we're rerunning an interrupted job, or the dirty-region pass found no change under this tile,
+        # and the file exists with a configuration record do no work here.
+        if (self.resumeinterrupted or self.unchanged) and tileResult["filename"] in self.existingFiles and self.uniqueKey() in self.previousConfigData.get("files",{}):
             tileResult = self.previousConfigData["files"][self.uniqueKey()]
             tileResult["status"] = "Skipped"
             return tileResult
@@ -100,10 +187,18 @@ class Tile:
         writefile = True
         
         # gimp.message('Creating a tile...')
-        new_image = self.image.duplicate()
         offset_x = self.x * BOX
         offset_y = self.y * BOX    
-        pdb.gimp_image_crop(new_image, BOX, BOX, offset_x, offset_y)
+        new_image = scratch.load(self.image.active_layer, offset_x, offset_y)
+        
+        # Hash the source pixels first: if they match the previous run, the existing file is still
+        # correct and the palette conversion, md5 and save can all be skipped.
+        tileResult["rawhash"] = raw_hash(scratch.pixels)
+        if tileResult["filename"] in self.existingFiles and tileResult["rawhash"] == self.getPreviousRawHash(self.uniqueKey()):
+            tileResult["md5"] = self.getPreviousMD5(self.uniqueKey())
+            self.status = "Skipped"
+            tileResult["status"] = self.status
+            return tileResult
         
         if not pdb.gimp_drawable_is_indexed(new_image.active_layer):
             pdb.gimp_image_convert_indexed(new_image, 1, 0, 256, False, False, "")
@@ -130,8 +225,6 @@ class Tile:
             self.status = "Done"
         else:            
             self.status = "Skipped"
-        
-        pdb.gimp_image_delete(new_image)
             
         tileResult["status"] = self.status
         
@@ -145,56 +238,46 @@ class Tile:
     
         return description
     
-class WorkQueue:
-    def __init__(self, communicationQueue, num):
-        self.thread = threading.Thread(target=self.process_work_queue, args=())
-        self.work = []
-        self.notdone = 0
-        self.done = 0
-        self.skipped = 0
-        self.error = 0
-        self.queueNumber = num
+class TileWorker:
+    """
+    A worker thread that takes tiles from the shared task queue until it receives
+    the None sentinel, posting each tile's result to the communication queue.
+    Because all workers draw from one queue, a worker that finishes a cheap tile
+    simply takes the next one, so no thread sits idle while others have a backlog.
+    """
+    def __init__(self, taskQueue, communicationQueue, num):
+        self.thread = threading.Thread(target=self.process_tasks, args=())
+        self.taskQueue = taskQueue
         self.communicationQueue = communicationQueue
+        self.queueNumber = num
         
-    # Given a queue of work, cycle through it and create tiles.
-    def process_work_queue(self):
-        # gimp.message("Processing work queue: " + str(+ self.queueNumber + ", items: " + len(self.work)))
-        self.notdone = len(self.work) 
+    def process_tasks(self):
+        scratch = ScratchImage()
         
-        for workitem in self.work:
-            status = "None"
-            try:
-                tileResult = workitem.create_tile() 
+        try:
+            while True:
+                workitem = self.taskQueue.get()
+                if workitem is None:
+                    break
+                    
+                try:
+                    tileResult = workitem.create_tile(scratch) 
+                except Exception as e:
+                    workitem.status = "Error"
+                    gimp.message("Error in tile creation: " + str(e))
+                    tileResult = {}
+                    tileResult["key"] = workitem.uniqueKey()
+                    tileResult["status"] = "Error"
+                    tileResult["error"] = str(e)
+                    
                 tileResult["queueNumber"] = self.queueNumber
                 self.communicationQueue.put(tileResult)
-                time.sleep(0.0001) # Brief pause to allow main thread to receive updates.
-            except Exception as e:
-                status = "Error"
-                workitem.status = status
-                gimp.message("Error in tile creation: " + str(e))
-                tileResult = {}
-                tileResult["key"] = workitem.uniqueKey()
-                tileResult["error"] = str(e)
-                tileResult["queueNumber"] = self.queueNumber
-                self.communicationQueue.put(tileResult)                
-            finally:
-                if tileResult["status"] == "Error":
-                    self.error = self.error + 1
-                elif tileResult["status"] == "Skipped":
-                    self.skipped = self.skipped + 1
-                else:
-                    self.done = self.done + 1
-                
-                self.notdone = self.notdone - 1
-                # gimp.message(json.dumps(tileResult))
-                
-        # gimp.message("Completed work queue: " + str(len(self.work)))
-          
-    def addWork(self, tile):
-        self.work.append(tile)
+        finally:
+            scratch.delete()
+            # A None result tells the main thread this worker has stopped.
+            self.communicationQueue.put(None)
         
     def start(self):
-        # gimp.message("Thread Initiated")    
         self.thread.start()
         
     def is_alive(self):
@@ -202,6 +285,45 @@ class WorkQueue:
         
     def join(self):
         self.thread.join()
+
+def put_task(taskQueue, item, workerList):
+    """
+    Put an item on the bounded task queue, waiting while it is full as long as at
+    least one worker is alive to empty it. Returns False if every worker has stopped.
+    """
+    while True:
+        try:
+            taskQueue.put(item, True, QUEUE_WAIT)
+            return True
+        except Full:
+            if not any(worker.is_alive() for worker in workerList):
+                return False
+
+def queue_tiles(taskQueue, workerList, tileCounts, zoomImageMap, output_dir, existingFiles, previousConfigData, resumeinterrupted, dirtyTiles):
+    """
+    Feed every tile of every zoom level into the shared task queue, followed by one
+    None per worker to tell it to stop. The queue is bounded, so put() waits while
+    the workers catch up and only a handful of Tile objects exist at any time.
+    If every worker dies, the remaining tiles are dropped instead of waiting forever.
+    dirtyTiles is the set of max-zoom (x, y) tiles that changed, or None if unknown.
+    """
+    max_zoom = max(tileCounts.keys())
+    try:
+        for z in sorted(tileCounts.keys(), reverse=True):
+            shift = max_zoom - z
+            dirtyAtZoom = None
+            if dirtyTiles is not None:
+                dirtyAtZoom = set([(x >> shift, y >> shift) for (x, y) in dirtyTiles])
+            for x in xrange(tileCounts[z]):
+                for y in xrange(tileCounts[z]):
+                    unchanged = dirtyAtZoom is not None and (x, y) not in dirtyAtZoom
+                    if not put_task(taskQueue, Tile(x, y, z, zoomImageMap[z], output_dir, existingFiles, previousConfigData, resumeinterrupted, unchanged), workerList):
+                        gimp.message("All tile workers have stopped; the remaining tiles were not created.")
+                        return
+    finally:
+        for worker in workerList:
+            if not put_task(taskQueue, None, workerList):
+                break
  
 def safe_output_path(image, prefix, output_dir):
     output_path = os.path.join(output_dir, prefix + image.name + FILE_TYPE)
@@ -226,38 +348,13 @@ def calc_dimension(zoom_level, image):
         
     return dimension
 
-def count_all_status(queueList):
-    notdone = 0
-    done = 0
-    error = 0
-    active = 0
-    inactive = 0
-    skipped = 0
-    
-    for worklist in queueList:
-        notdone = notdone + worklist.notdone
-        done = done + worklist.done
-        error = error + worklist.error
-        skipped = skipped + worklist.skipped
-        
-        if worklist.is_alive():
-            active = active + 1
-        else:
-            inactive = inactive + 1
-            
-    # gimp.message("Active: " + str(active) + ", " + "Inactive: " + str(inactive))
-                
-    return [notdone, done, error, active, skipped]
-
-def status_check(queueList, configData):
-    counts = count_all_status(queueList)
-    notdone = counts[0]
-    done = counts[1]
-    error = counts[2]
-    active = counts[3]
-    skipped = counts[4]
+def status_check(counts, maxtiles, active, configData):
+    done = counts["Done"]
+    skipped = counts["Skipped"]
+    error = counts["Error"]
+    notdone = maxtiles - done - skipped - error
     
-    progress = float(done + skipped + error) / float(done + skipped + notdone + error)
+    progress = float(done + skipped + error) / float(max(maxtiles, 1))
     
     configData["errors"]["count"] = error
     configData["status"]["done"] = done
@@ -265,10 +362,8 @@ def status_check(queueList, configData):
     configData["status"]["skipped"] = skipped
     configData["status"]["progress"] = progress
     
-    pdb.gimp_progress_set_text("Active Threads: " + str(active) + ", Done: " + str(done + skipped) + " (" + str(int(progress * 100)) + "%)")
-    pdb.gimp_progress_update(progress) 
-        
-    return active
+    progress_text("Active Threads: " + str(active) + ", Done: " + str(done + skipped) + " (" + str(int(progress * 100)) + "%)")
+    progress_update(progress) 
 
 def prepare_image(image, layer, dimension):
     """
@@ -283,7 +378,7 @@ def prepare_image(image, layer, dimension):
         new_width = dimension
         new_height = new_width * height / width
         
-    pdb.gimp_progress_set_text("Scaling source image.")
+    progress_text("Scaling source image.")
     pdb.gimp_image_scale(image, new_width, new_height)
 
     pdb.gimp_image_resize(image, dimension, dimension, (dimension - image.width) / 2, (dimension - image.height) / 2) #Make it square and center 
@@ -307,6 +402,26 @@ def initializeConfig():
     
     return data
 
+def replayJournal(output_dir, data):
+    """
+    Apply the tile results recorded in the journal on top of the snapshot data.
+    Returns the number of records applied. A partly written last line (from a crash) is ignored.
+    """
+    journalPath = os.path.join(output_dir, journalFile)
+    applied = 0
+    
+    if os.path.exists(journalPath):
+        with open(journalPath, "r") as infile:
+            for line in infile:
+                try:
+                    tileResult = json.loads(line)
+                except ValueError:
+                    break
+                data["files"][tileResult["key"]] = tileResult
+                applied = applied + 1
+                
+    return applied
+
 def loadPreviousConfig(output_dir):
     data = {}
         
@@ -315,14 +430,25 @@ def loadPreviousConfig(output_dir):
         # Reading config file, if it exists
         with open(os.path.join(output_dir, configFile), "r") as infile:
             data = json.load(infile)
-            data["status"] = {}
-            data["errors"]["count"] = 0        
-            data["errors"]["log"] = {}
+    
+    if os.path.exists(os.path.join(output_dir, journalFile)):
+        if not data:
+            data = initializeConfig()
             
-            # On a rerun, mark tiles as "To Verify". This will get replaced with this runs processing of them.
-            for tiledata in data["files"]:
-                # gimp.message(json.dumps(tiledata))
-                data["files"][tiledata]["status"] = "To Verify"
+        # Fold in the tiles an interrupted run finished after its last snapshot, then start a fresh journal.
+        if replayJournal(output_dir, data) > 0:
+            saveConfigData(output_dir, data)
+        open(os.path.join(output_dir, journalFile), "w").close()
+    
+    if data:
+        data["status"] = {}
+        data["errors"]["count"] = 0        
+        data["errors"]["log"] = {}
+        
+        # On a rerun, mark tiles as "To Verify". This will get replaced with this runs processing of them.
+        for tiledata in data["files"]:
+            # gimp.message(json.dumps(tiledata))
+            data["files"][tiledata]["status"] = "To Verify"
     
     return data
     
@@ -334,6 +460,44 @@ def saveConfigData(output_dir, data):
     with open(os.path.join(output_dir, configFile), "w") as outfile:
         outfile.write(json_object)        
 
+class ProgressJournal:
+    """
+    Append-only record of tile results, one JSON object per line.
+    Each tile costs one short append, no matter how many tiles came before it.
+    Every JOURNAL_COMPACT_EVERY records the journal is folded into a config.json
+    snapshot and emptied, so restarts only replay a short tail.
+    """
+    def __init__(self, output_dir, previousConfigData):
+        self.output_dir = output_dir
+        self.previousFiles = previousConfigData.get("files", {})
+        self.path = os.path.join(output_dir, journalFile)
+        self.file = open(self.path, "a")
+        self.records = 0
+        
+    def record(self, tileResult, configData):
+        self.file.write(json.dumps(tileResult) + "\n")
+        self.records = self.records + 1
+        
+        if self.records % JOURNAL_COMPACT_EVERY == 0:
+            # Tiles this run has not reached yet keep their previous records in the snapshot.
+            snapshot = dict(configData)
+            snapshot["files"] = dict(self.previousFiles)
+            snapshot["files"].update(configData["files"])
+            self.compact(snapshot)
+        elif self.records % JOURNAL_FLUSH_EVERY == 0:
+            self.file.flush()
+    
+    def compact(self, configData):
+        # Write the snapshot before emptying the journal, so a crash in between only replays records twice.
+        self.file.flush()
+        saveConfigData(self.output_dir, configData)
+        self.file.close()
+        self.file = open(self.path, "w")
+        
+    def close(self, configData):
+        self.compact(configData)
+        self.file.close()
+
 # When gimp supports python 3.5+, replace this with scandir
 def list_files_recursive(directory):
     file_paths = []
@@ -346,7 +510,8 @@ def list_files_recursive(directory):
     return file_paths
 
 def inventoryExistingFiles(output_dir):
-    existingFiles = list_files_recursive(output_dir)
+    # A set, as every tile checks for its own file.
+    existingFiles = set(list_files_recursive(output_dir))
     
     return existingFiles
     # Approach below is quite slow.
@@ -354,6 +519,40 @@ def inventoryExistingFiles(output_dir):
     #    for file in files:
     #        existingFiles[os.path.join(root, file)] = True     
 
+def find_dirty_tiles(prepared_img, previousConfigData, zoom_level):
+    """
+    Compare each max-zoom tile of the newly prepared map with the rawhash recorded for its file by
+    earlier runs, and return the set of (x, y) tiles that changed.
+    Only the map already in memory is read, one tile at a time; no previous image is loaded.
+    Returns None (everything must be checked) if there are no comparable records, or if the
+    previous run did not complete: its lower zoom levels may still hold tiles of an older map.
+    """
+    previousFiles = previousConfigData.get("files", {})
+    size = prepared_img.width
+    if not previousFiles or not previousConfigData.get("complete") or previousConfigData.get("referencesize") != size:
+        return None
+        
+    tilesPerSide = size / BOX
+    layer = prepared_img.active_layer
+    rgn = layer.get_pixel_rgn(0, 0, size, size, False, False)
+    
+    dirty = set()
+    for x in xrange(tilesPerSide):
+        for y in xrange(tilesPerSide):
+            key = "(" + str(zoom_level) + "," + str(x) + "," + str(y) + ")"
+            previousHash = previousFiles.get(key, {}).get("rawhash")
+            if previousHash is None or raw_hash(rgn[x * BOX:(x + 1) * BOX, y * BOX:(y + 1) * BOX]) != previousHash:
+                dirty.add((x, y))
+    
+    # Scaling down for the lower zoom levels blends pixels across tile edges, so include the neighbours of each change.
+    grown = set()
+    for (x, y) in dirty:
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                grown.add((x + dx, y + dy))
+                
+    return grown
+
 def leaflet_tile(image, layer, output_dir, zoom_level, numthreads, resumeinterrupted):
     """
     Tiles the image for use in Leaflet maps.
@@ -364,22 +563,26 @@ def leaflet_tile(image, layer, output_dir, zoom_level, numthreads, resumeinterru
     # gimp.message("Initializing Tiling Logic")
 
     zoomImageMap = {}
-    workQueueList = []
+    workerList = []
 
-    gimp.progress_init("Evalutating current state.")  
+    progress_init("Evalutating current state.")  
     configData = initializeConfig()
     previousConfigData = loadPreviousConfig(output_dir)
     existingFiles = inventoryExistingFiles(output_dir)
-    pdb.gimp_progress_end()
+    progress_end()
     
     # Assisting Debug
     # configData["existingFiles"] = existingFiles
     # configData["previousConfigData"] = previousConfigData
     
     # Ensure we are not maniuplating the source image - just a copy of it.    
-    gimp.progress_init("Preparing source image.") 
+    progress_init("Preparing source image.") 
     temp_img = image.duplicate()
     temp_img.disable_undo()
+    
+    # Tiles are cut into RGB scratch images, so work in RGB throughout.
+    if pdb.gimp_image_base_type(temp_img) != RGB:
+        pdb.gimp_image_convert_rgb(temp_img)
 
     zoom_level = int(zoom_level)   
     numthreads = int(numthreads)
@@ -391,22 +594,32 @@ def leaflet_tile(image, layer, output_dir, zoom_level, numthreads, resumeinterru
     prepare_image(temp_img, layer, dimension)
     
     output_path = safe_output_path(image, "template_", output_dir)
+    
+    # Find which tiles changed since they were last written. Resumed jobs skip existing tiles anyway.
+    dirtyTiles = None
+    if not resumeinterrupted:
+        progress_text("Finding changed areas.")
+        dirtyTiles = find_dirty_tiles(temp_img, previousConfigData, zoom_level)
+    
+    # Until this run completes, config.json must not vouch for the tiles it is about to replace.
+    if previousConfigData.pop("complete", False):
+        saveConfigData(output_dir, previousConfigData)
+            
     # pdb.file_jpeg_save(temp_img, temp_img.active_layer, output_path, output_path, 0.9, 0, 0, 0,'Creating with GIMP', 0, 0, 0, 0) 
     pdb.file_png_save(temp_img, temp_img.active_layer, output_path, output_path, 0, 0, 0, 0, 0, 0, 0)
     
-    # Initialize our list of lists for holding threaded work queues
+    # All workers share one bounded task queue, and report results back on the communication queue.
+    taskQueue = Queue(numthreads * 4)
     communicationQueue = Queue()
-    queueNumber = 0
     for tp in xrange(numthreads):
-        workQueueList.append(WorkQueue(communicationQueue, queueNumber))
-        queueNumber = queueNumber + 1
+        workerList.append(TileWorker(taskQueue, communicationQueue, tp))
     
     # prepare_initial_image(temp_img, dimension, output_dir)
     scaledDimension = dimension
-    pdb.gimp_progress_end()
+    progress_end()
     
     # Scale a source image for each zoom level.
-    gimp.progress_init("Preparing zoom masters.") 
+    progress_init("Preparing zoom masters.") 
     for z in xrange(zoom_level, -1, -1):
         # The min zoom is the point at which the map size is no longer evenly divisible into BOX-sized chunks.
         if scaledDimension % BOX == 0:
@@ -417,8 +630,8 @@ def leaflet_tile(image, layer, output_dir, zoom_level, numthreads, resumeinterru
             pdb.gimp_image_scale(temp_img, scaledDimension, scaledDimension)
             min_zoom = z
     
-        pdb.gimp_progress_update(float(z)/float(zoom_level)) 
-    pdb.gimp_progress_end()
+        progress_update(float(z)/float(zoom_level)) 
+    progress_end()
     
     configData["minzoom"] = min_zoom
     pdb.gimp_image_delete(temp_img)
@@ -428,76 +641,110 @@ def leaflet_tile(image, layer, output_dir, zoom_level, numthreads, resumeinterru
     # pdb.file_jpeg_save(thumbnail, thumbnail.active_layer, output_path, output_path, 0.9, 0, 0, 0,'Creating with GIMP', 0, 0, 0, 0)     
     pdb.file_png_save(thumbnail, thumbnail.active_layer, output_path, output_path, 0, 0, 0, 0, 0, 0, 0)
             
+    # Don't bother trying to create tiles for zoom levels for which no image was created.
+    tileCounts = {}
     maxtiles = 0
-    threadallocator = 0
+    for z in zoomImageMap:
+        tileCounts[z] = zoomImageMap[z].width / BOX
+        maxtiles = maxtiles + tileCounts[z] * tileCounts[z]
     
-    gimp.progress_init("Registering zoom layers.")     
-    for z in xrange(zoom_level, -1, -1):
-        # Don't bother trying to create tiles for zoom levels for which no image was created.
-        if z in zoomImageMap:
-            scaledDimension = zoomImageMap[z].width
-            for x in xrange(scaledDimension / BOX):
-                for y in xrange(scaledDimension / BOX):
-                    maxtiles = maxtiles + 1
-                    newTile = Tile(x, y, z, zoomImageMap[z], output_dir, existingFiles, previousConfigData, resumeinterrupted)
-
-                    workQueueList[threadallocator].addWork(newTile)
-                    threadallocator = threadallocator + 1
-                    if threadallocator >= numthreads:
-                        threadallocator = 0
-                        
-        pdb.gimp_progress_update(float(z)/float(zoom_level)) 
-    pdb.gimp_progress_end()
-    
-    gimp.progress_init ("Tiling " + str(maxtiles) + " tiles.")    
-    # Create threaded lists that divide up the work of the entire list of tile items.
-    for workqueue in workQueueList:
-        # gimp.message("Queuesize: " + str(len(workqueue.work)))
-        try:
-            workqueue.start()
-            # gimp.message("Launched work queue.")
-            # workqueue.join()
-        except:
-            gimp.message("Failed to launch work queue.")
+    progress_init("Tiling " + str(maxtiles) + " tiles.")    
+    # Start the workers first: the producer gives up once none of them is alive.
+    for worker in workerList:
+        worker.start()
+    
+    producer = threading.Thread(target=queue_tiles, args=(taskQueue, workerList, tileCounts, zoomImageMap, output_dir, existingFiles, previousConfigData, resumeinterrupted, dirtyTiles))
+    producer.start()
        
-    pdb.gimp_progress_set_text("All work queues started.")         
-    active = status_check(workQueueList, configData)
+    progress_text("All workers started.")         
     
+    journal = ProgressJournal(output_dir, previousConfigData)
+    counts = {"Done": 0, "Skipped": 0, "Error": 0}
+    active = numthreads
     tileDoneCount = 0
-    while active > 0 or not communicationQueue.empty():
-
-        while not communicationQueue.empty():
-            tileResult = communicationQueue.get()
-            configData["files"][tileResult["key"]] = tileResult
-            tileDoneCount = tileDoneCount + 1
+    while active > 0:
+        # Block until a worker reports in; progress is driven by tile completions rather than polling.
+        tileResult = communicationQueue.get()
+        if tileResult is None:
+            active = active - 1
+            continue
+            
+        configData["files"][tileResult["key"]] = tileResult
+        journal.record(tileResult, configData)
+        status = tileResult.get("status", "Done")
+        counts[status] = counts.get(status, 0) + 1
+        tileDoneCount = tileDoneCount + 1
+    
+        if tileDoneCount % 20 == 0:
+            status_check(counts, maxtiles, active, configData)
+    
+    producer.join()
+    for worker in workerList:
+        worker.join()
         
-            if tileDoneCount % 20 == 0:
-                active = status_check(workQueueList, configData)
-                # gimp.message("Active: " + str(active))
-                
-            if tileDoneCount % 100 == 0:
-                # Periodically save intermediate progress                
-                saveConfigData(output_dir, configData)
-
-        if active == 0:
-            pdb.gimp_progress_set_text("Saving Results.")
-            pdb.gimp_progress_update(float(maxtiles - communicationQueue.qsize()) / float(maxtiles))
-        else:
-            time.sleep(0.0001) # Brief pause for status thread to yeild to worker threads.        
-            active = status_check(workQueueList, configData)            
+    status_check(counts, maxtiles, active, configData)
     
     # gimp.message("Main loop complete.")
     
-    pdb.gimp_progress_set_text('Tiling Complete!')
-    pdb.gimp_progress_end()
+    progress_text('Tiling Complete!')
+    progress_end()
     
-    saveConfigData(output_dir, configData)
+    # Write the final snapshot and empty the journal. Only the records of a full run can be used to skip
+    # unchanged tiles next time: a resumed run keeps whatever tiles the interrupted one left behind.
+    if not resumeinterrupted:
+        configData["complete"] = True
+    journal.close(configData)
 
     # Clean up memory.
     for z in xrange(zoom_level, -1, -1):
         if z in zoomImageMap:
             pdb.gimp_image_delete(zoomImageMap[z])
 
+def leaflet_tile_batch(jobfile):
+    """
+    Runs a list of tiling jobs back to back without GUI progress, for use from GIMP batch mode.
+
+    Parameters:
+    jobfile : string A JSON file holding a list of jobs, each with "image", "output_dir" and "zoom_level",
+              and optionally "numthreads" and "resumeinterrupted". For example:
+              [{"image": "C:\\maps\\merisyl.png", "output_dir": "C:\\temp\\tiles\\merisyl", "zoom_level": 8}]
+    """
+    global showProgress
+    showProgress = False
+
+    with open(jobfile, "r") as f:
+        jobs = json.load(f)
+
+    # Each image is loaded once and kept until its last job has run, so several zoom/output jobs can share it.
+    remaining = {}
+    for job in jobs:
+        remaining[job["image"]] = remaining.get(job["image"], 0) + 1
+    loaded = {}
+    failed = 0
+
+    for num, job in enumerate(jobs):
+        path = job["image"]
+        try:
+            if path not in loaded:
+                loaded[path] = pdb.gimp_file_load(path, path)
+            image = loaded[path]
+
+            if not os.path.exists(job["output_dir"]):
+                os.makedirs(job["output_dir"])
+
+            gimp.message("Job " + str(num + 1) + " of " + str(len(jobs)) + ": tiling " + path + " into " + job["output_dir"])
+            leaflet_tile(image, image.active_layer, job["output_dir"], job.get("zoom_level", ZOOM_DEFAULT),
+                         job.get("numthreads", THREADPOOL), job.get("resumeinterrupted", False))
+        except Exception as e:
+            failed = failed + 1
+            gimp.message("Job " + str(num + 1) + " failed: " + str(e) + "\n" + traceback.format_exc())
+        finally:
+            remaining[path] = remaining[path] - 1
+            if remaining[path] == 0 and path in loaded:
+                pdb.gimp_image_delete(loaded.pop(path))
+
+    gimp.message("Batch complete: " + str(len(jobs) - failed) + " of " + str(len(jobs)) + " jobs succeeded.")
+
 register(
     'Tilemaker',
     'Create leaflet tiles for current image.',
@@ -520,4 +767,20 @@ register(
     menu='<Image>/Filters/Tilemaker/Make Map Tiles'
 )
 
+register(
+    'tilemaker-batch',
+    'Create leaflet tiles for a list of images.',
+    'Runs a JSON list of tiling jobs (image, output directory, zoom level) without GUI progress, for use from GIMP batch mode',
+    'Al Mele',
+    'GNU GPL v3',
+    '2023',
+    '',
+    '',
+    [
+        (PF_FILE, 'jobfile', 'JSON job list', '')
+    ],
+    [],
+    leaflet_tile_batch
+)
+
 main()
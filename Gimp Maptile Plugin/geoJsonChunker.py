@@ -0,0 +1,169 @@
+import os
+import re
+import json
+import math
+import argparse
+import tempfile
+from GeoJsonAdjust import (
+    FeatureCollectionWriter, geometry_bbox, iter_features, merge_bbox
+)
+
+BOX = 256
+
+# Features held in memory across all cells before they are spooled to disk.
+SPOOL_FEATURES = 50000
+CHUNK_PATTERN = re.compile(r"^\d+_\d+\.geojson$")
+
+
+def cell_for_bbox(bbox, referencesize, cellsize):
+    """
+    Return the (column, row) of the grid cell holding the center of a bbox.
+
+    Coordinates are in the centered system used by svgToGeoJSON.py (+Y north),
+    while the grid follows the tile layout (origin at the top-left corner of
+    the tilebase image, rows counting down), so cell (x, y) covers the same
+    area as the zoom-level tiles under the same folder/file numbers.
+    """
+    half = referencesize / 2.0
+    center_x = (bbox[0] + bbox[2]) / 2.0
+    center_y = (bbox[1] + bbox[3]) / 2.0
+    cells = int(math.ceil(referencesize / cellsize))
+
+    column = int((center_x + half) // cellsize)
+    row = int((half - center_y) // cellsize)
+    return min(max(column, 0), cells - 1), min(max(row, 0), cells - 1)
+
+
+def chunk_geojson(input_geojson, output_dir, referencesize, cellsize, compact=True):
+    """
+    Split a FeatureCollection into one chunk file per grid cell.
+
+    Each feature goes to the single cell containing the center of its bbox, so
+    no feature is drawn twice. Each feature and chunk gets a "bbox" member, and
+    index.json records every chunk's file, bbox and feature count, so a client
+    only needs to fetch chunks whose bbox overlaps the viewport. Chunk files
+    from an earlier run for cells that are now empty are removed.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    pending = {}
+    counts = {}
+    buffered = 0
+    unplaced = 0
+
+    # Features are grouped per cell in memory and appended to one spool file
+    # per cell when too many are held, so no file stays open per cell and a
+    # small cell size cannot run out of file handles.
+    with tempfile.TemporaryDirectory(dir=output_dir) as spool_dir:
+        def spool():
+            for key, features in pending.items():
+                with open(os.path.join(spool_dir, key), "a") as f:
+                    for feature in features:
+                        f.write(json.dumps(feature) + "\n")
+            pending.clear()
+
+        for feature in iter_features(input_geojson):
+            box = geometry_bbox(feature.get("geometry"))
+            if box is None:
+                unplaced += 1
+                continue
+
+            column, row = cell_for_bbox(box, referencesize, cellsize)
+            key = f"{column}_{row}"
+            pending.setdefault(key, []).append(feature)
+            counts[key] = counts.get(key, 0) + 1
+            buffered += 1
+            if buffered >= SPOOL_FEATURES:
+                spool()
+                buffered = 0
+
+        chunks = {}
+        for key in sorted(counts):
+            with FeatureCollectionWriter(
+                os.path.join(output_dir, key + ".geojson"), compact=compact, bbox=True
+            ) as writer:
+                spooled = os.path.join(spool_dir, key)
+                if os.path.exists(spooled):
+                    with open(spooled, "r") as f:
+                        for line in f:
+                            writer.write(json.loads(line))
+                for feature in pending.get(key, []):
+                    writer.write(feature)
+            chunks[key] = writer
+
+    # Chunks left from an earlier run would still be served from the directory.
+    for name in os.listdir(output_dir):
+        if CHUNK_PATTERN.match(name) and name[:-len(".geojson")] not in chunks:
+            os.remove(os.path.join(output_dir, name))
+
+    index = {
+        "source": os.path.basename(input_geojson),
+        "referencesize": referencesize,
+        "cellsize": cellsize,
+        "bbox": None,
+        "chunks": {},
+    }
+    for key, writer in chunks.items():
+        index["bbox"] = merge_bbox(index["bbox"], writer.bbox)
+        index["chunks"][key] = {
+            "file": key + ".geojson",
+            "bbox": writer.bbox,
+            "count": writer.count,
+        }
+
+    with open(os.path.join(output_dir, "index.json"), "w") as f:
+        json.dump(index, f, indent=2)
+
+    return index, unplaced
+
+
+# Example Usage:
+# python geoJsonChunker.py .\Locations\Aunea.geojson -o .\chunks\Aunea --referencesize 81920 --cell-tiles 32
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Split a GeoJSON FeatureCollection into grid-cell chunk files aligned\n"
+            "to the map tile grid, with an index.json mapping cells to chunks."
+        ),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("input_geojson", help="Input GeoJSON file")
+    parser.add_argument(
+        "-o", "--output-dir",
+        required=True,
+        help="Directory for the chunk files and index.json"
+    )
+    parser.add_argument(
+        "--referencesize",
+        type=int,
+        required=True,
+        help="Side length of the tilebase image (the map page's referencesize)"
+    )
+    parser.add_argument(
+        "--cell-tiles",
+        type=int,
+        default=32,
+        help=f"Cell side in max-zoom tiles of {BOX} pixels (default: 32)"
+    )
+    parser.add_argument(
+        "--indent",
+        action="store_true",
+        help="Write chunk features indented instead of one per line"
+    )
+
+    args = parser.parse_args()
+
+    if args.referencesize % BOX:
+        parser.error(f"--referencesize must be a multiple of {BOX}")
+
+    cellsize = args.cell_tiles * BOX
+    index, unplaced = chunk_geojson(
+        args.input_geojson, args.output_dir, args.referencesize, cellsize, compact=not args.indent
+    )
+
+    print(f"Wrote {len(index['chunks'])} chunks to {args.output_dir}")
+    if unplaced:
+        print(f"Skipped {unplaced} features without coordinates")
+
+
+if __name__ == "__main__":
+    main()
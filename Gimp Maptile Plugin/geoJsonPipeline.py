@@ -0,0 +1,235 @@
+import os
+import re
+import sys
+import glob
+import argparse
+from GeoJsonAdjust import (
+    JSON_ERRORS, affine_matrix, geometry_bbox, iter_features, offset_feature,
+    transform_feature, write_feature_collection
+)
+
+OPERATION_HELP = """Operations (applied in the order given, in one pass over the features):
+  offset:DX,DY                 Add DX/DY to every coordinate
+  scale:FACTOR[,CX,CY]         Scale about CX,CY (default: map center 0,0)
+  rotate:DEGREES[,CX,CY]       Rotate counter-clockwise about CX,CY
+  round:DIGITS                 Round coordinates to DIGITS decimal places
+  bbox:XMIN,YMIN,XMAX,YMAX     Keep only features whose bbox intersects this box
+  where:KEY[=VALUE]            Keep only features with property KEY (equal to VALUE)
+  rename:OLD=NEW               Rename property OLD to NEW
+  camelcase                    Rename hyphenated properties to camelCase (fill-opacity -> fillOpacity)
+
+Example:
+  python geoJsonPipeline.py "Locations/*.geojson" -o build --op offset:85,-250 --op round:2 --op camelcase
+"""
+
+
+def round_coords(coords, digits):
+    """Recursively round a GeoJSON coordinates array."""
+    if coords and isinstance(coords[0], (int, float)):
+        return [round(c, digits) for c in coords]
+    return [round_coords(c, digits) for c in coords]
+
+
+def round_geometry(geometry, digits):
+    if geometry is None:
+        return None
+
+    if geometry.get("type") == "GeometryCollection":
+        geometry["geometries"] = [
+            round_geometry(g, digits) for g in geometry.get("geometries", [])
+        ]
+    elif geometry.get("coordinates"):
+        geometry["coordinates"] = round_coords(geometry["coordinates"], digits)
+    return geometry
+
+
+def camel_case(key):
+    """
+    Same rewrite the map page applies to style keys: stroke-width -> strokeWidth.
+    Like tiledFantasyMap.js, only the first hyphen is replaced.
+    """
+    return re.sub(r"-(\w)", lambda m: m.group(1).upper(), key, count=1)
+
+
+def _numbers(arg, count, name):
+    try:
+        values = [float(v) for v in arg.split(",")] if arg else []
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{name}: expected numbers, got '{arg}'")
+    if len(values) not in count:
+        raise argparse.ArgumentTypeError(f"{name}: expected {' or '.join(map(str, count))} values, got '{arg}'")
+    return values
+
+
+def _center(values):
+    return (values[1], values[2]) if len(values) == 3 else (0.0, 0.0)
+
+
+def parse_operation(spec):
+    """
+    Turn an operation spec such as "offset:85,-250" into a function that
+    takes a Feature and returns it (possibly modified) or None to drop it.
+    """
+    name, _, arg = spec.partition(":")
+
+    if name == "offset":
+        dx, dy = _numbers(arg, (2,), name)
+        return lambda f: offset_feature(f, dx, dy)
+
+    if name == "scale":
+        values = _numbers(arg, (1, 3), name)
+        matrix = affine_matrix(scale=values[0], center=_center(values))
+        return lambda f: transform_feature(f, matrix)
+
+    if name == "rotate":
+        values = _numbers(arg, (1, 3), name)
+        matrix = affine_matrix(rotation=values[0], center=_center(values))
+        return lambda f: transform_feature(f, matrix)
+
+    if name == "round":
+        try:
+            digits = int(arg)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"round: expected an integer, got '{arg}'")
+
+        def apply_round(feature):
+            feature["geometry"] = round_geometry(feature.get("geometry"), digits)
+            return feature
+        return apply_round
+
+    if name == "bbox":
+        xmin, ymin, xmax, ymax = _numbers(arg, (4,), name)
+
+        def apply_bbox(feature):
+            box = geometry_bbox(feature.get("geometry"))
+            if box is None:
+                return None
+            if box[2] < xmin or box[0] > xmax or box[3] < ymin or box[1] > ymax:
+                return None
+            return feature
+        return apply_bbox
+
+    if name == "where":
+        if not arg:
+            raise argparse.ArgumentTypeError("where: expected KEY or KEY=VALUE")
+        key, has_value, value = arg.partition("=")
+
+        def apply_where(feature):
+            props = feature.get("properties") or {}
+            if key not in props:
+                return None
+            if has_value and str(props[key]) != value:
+                return None
+            return feature
+        return apply_where
+
+    if name == "rename":
+        old, _, new = arg.partition("=")
+        if not old or not new:
+            raise argparse.ArgumentTypeError(f"rename: expected OLD=NEW, got '{arg}'")
+
+        def apply_rename(feature):
+            props = feature.get("properties") or {}
+            if old in props:
+                props[new] = props.pop(old)
+            return feature
+        return apply_rename
+
+    if name == "camelcase":
+        def apply_camelcase(feature):
+            props = feature.get("properties") or {}
+            feature["properties"] = {camel_case(k): v for k, v in props.items()}
+            return feature
+        return apply_camelcase
+
+    raise argparse.ArgumentTypeError(f"Unknown operation '{name}'")
+
+
+def run_pipeline(features, operations):
+    """Lazily apply each operation in turn to every feature, dropping filtered ones."""
+    for feature in features:
+        for operation in operations:
+            feature = operation(feature)
+            if feature is None:
+                break
+        else:
+            yield feature
+
+
+def output_paths(input_files, output):
+    """
+    Pair each input with its output path. A single input writes to `output`
+    unless it is an existing directory; several inputs write into `output`
+    as a directory, keeping their file names.
+    """
+    if len(input_files) == 1 and not os.path.isdir(output):
+        return [(input_files[0], output)]
+
+    os.makedirs(output, exist_ok=True)
+    return [(f, os.path.join(output, os.path.basename(f))) for f in input_files]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Apply an ordered list of operations to GeoJSON FeatureCollections in a single streaming pass.",
+        epilog=OPERATION_HELP,
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="Input GeoJSON files or glob patterns"
+    )
+    parser.add_argument(
+        "-o", "--output",
+        required=True,
+        help="Output file for a single input, or output directory for several"
+    )
+    parser.add_argument(
+        "--op",
+        dest="operations",
+        action="append",
+        type=parse_operation,
+        default=[],
+        metavar="OPERATION",
+        help="Operation to apply; repeat for more (see below)"
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Write one feature per line without indentation"
+    )
+    parser.add_argument(
+        "--bbox",
+        action="store_true",
+        help="Add a bbox member to every feature and to the collection"
+    )
+
+    args = parser.parse_args()
+
+    input_files = sorted({p for pattern in args.inputs for p in glob.glob(pattern)})
+    if not input_files:
+        parser.error("No input files matched.")
+
+    failed = []
+    for input_file, output_file in output_paths(input_files, args.output):
+        if os.path.abspath(input_file) == os.path.abspath(output_file):
+            parser.error(f"Refusing to overwrite input file {input_file} while streaming from it.")
+        features = run_pipeline(iter_features(input_file), args.operations)
+        # Files that are not valid JSON (such as the Blank.geojson template) are
+        # reported and skipped; the writer leaves no partial output behind.
+        try:
+            write_feature_collection(features, output_file, compact=args.compact, bbox=args.bbox)
+        except JSON_ERRORS as e:
+            print(f"Skipping {input_file}: {e}")
+            failed.append(input_file)
+            continue
+        print(f"Wrote {output_file}")
+
+    if failed:
+        print(f"{len(failed)} of {len(input_files)} inputs could not be read")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
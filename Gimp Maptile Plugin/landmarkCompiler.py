@@ -0,0 +1,204 @@
+import os
+import glob
+import json
+import hashlib
+import argparse
+from openpyxl import load_workbook
+from GeoJsonAdjust import FeatureCollectionWriter
+
+MANIFEST_FILE = "landmarks-manifest.json"
+
+# Bump when the output format changes, so every workbook is rebuilt once.
+COMPILER_VERSION = 1
+
+# Columns a worksheet must have to be treated as a landmark list.
+REQUIRED_COLUMNS = ("Name", "Longitude", "Latitude")
+
+# Marker styling used by the hand-built landmark files (see FreeCityLandmarks.json).
+MARKER_PROPERTIES = {
+    "marker-color": "#7e7e7e",
+    "fill": "#7e7e7e",
+    "stroke": "#555555",
+    "marker-size": "medium",
+    "marker-symbol": "",
+}
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != COMPILER_VERSION:
+        return {}
+    return manifest.get("workbooks", {})
+
+
+def save_manifest(output_dir, workbooks):
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w") as f:
+        json.dump({"version": COMPILER_VERSION, "workbooks": workbooks}, f, indent=4)
+
+
+def landmark_feature(row):
+    """
+    Build a Point Feature from a landmark row (a dict of column name to value).
+    Returns None if the row has no name or no coordinates.
+    """
+    name = row.get("Name")
+    lng = row.get("Longitude")
+    lat = row.get("Latitude")
+    if not name or lng is None or lat is None:
+        return None
+
+    notes = row.get("Notes") or ""
+    properties = dict(MARKER_PROPERTIES)
+    properties["popup-text"] = f"<strong>{name}</strong><br>{notes}"
+    properties["marker-group"] = row.get("Type") or ""
+    if row.get("Location ID") is not None:
+        properties["ID"] = str(row["Location ID"])
+
+    return {
+        "type": "Feature",
+        "properties": properties,
+        "geometry": {"type": "Point", "coordinates": [lng, lat]}
+    }
+
+
+def iter_landmark_rows(workbook_path):
+    """
+    Yield each data row of every landmark worksheet in a workbook as a dict.
+    The workbook is opened read-only so rows are streamed rather than loaded.
+    Worksheets without the landmark columns are skipped.
+    """
+    workbook = load_workbook(workbook_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if not header or not all(c in header for c in REQUIRED_COLUMNS):
+                continue
+            for values in rows:
+                yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def compile_workbook(workbook_path, output_path):
+    """
+    Write the landmarks of one workbook as a FeatureCollection.
+    Returns (written, unplaced): the number of features written, and the
+    names of landmarks skipped for having no coordinates yet.
+    """
+    unplaced = []
+    with FeatureCollectionWriter(output_path) as writer:
+        for row in iter_landmark_rows(workbook_path):
+            feature = landmark_feature(row)
+            if feature is not None:
+                writer.write(feature)
+            elif row.get("Name"):
+                unplaced.append(row["Name"])
+        written = writer.count
+    return written, unplaced
+
+
+def is_landmark_workbook(workbook_path):
+    """True if any worksheet of the workbook has the landmark columns."""
+    workbook = load_workbook(workbook_path, read_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            header = next(sheet.iter_rows(max_row=1, values_only=True), None)
+            if header and all(c in header for c in REQUIRED_COLUMNS):
+                return True
+        return False
+    finally:
+        workbook.close()
+
+
+def compile_landmarks(workbook_paths, output_dir, force=False):
+    """
+    Compile each landmark workbook to <output_dir>/<name>.geojson, skipping
+    workbooks whose content hash matches the last build and whose output exists.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    previous = {} if force else load_manifest(output_dir)
+    manifest = {}
+
+    for workbook_path in workbook_paths:
+        key = os.path.basename(workbook_path)
+        stem = os.path.splitext(key)[0]
+        output_path = os.path.join(output_dir, stem + ".geojson")
+        digest = file_hash(workbook_path)
+
+        entry = previous.get(key)
+        if entry and entry.get("sha256") == digest and (entry.get("skipped") or os.path.exists(output_path)):
+            manifest[key] = entry
+            print(f"Unchanged: {key}")
+            continue
+
+        if not is_landmark_workbook(workbook_path):
+            print(f"Skipping {key}: no {', '.join(REQUIRED_COLUMNS)} columns")
+            manifest[key] = {"sha256": digest, "skipped": True}
+            continue
+
+        written, unplaced = compile_workbook(workbook_path, output_path)
+        manifest[key] = {"sha256": digest, "output": os.path.basename(output_path), "features": written}
+        print(f"Compiled {key}: {written} landmarks -> {output_path}")
+        if unplaced:
+            print(f"  {len(unplaced)} landmarks have no coordinates yet")
+
+    save_manifest(output_dir, manifest)
+    return manifest
+
+
+# Example Usage:
+# python landmarkCompiler.py ".\Locations\*.xlsx" -o .\Locations\landmarks
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compile landmark spreadsheets into Point FeatureCollections.\n\n"
+            "Worksheets need Name, Longitude and Latitude columns (Location ID,\n"
+            "Type and Notes are used when present). Coordinates are expected in\n"
+            "the centered system used by svgToGeoJSON.py. Only workbooks whose\n"
+            "contents changed since the last build are recompiled."
+        ),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "workbooks",
+        nargs="+",
+        help="Workbook files or glob patterns"
+    )
+    parser.add_argument(
+        "-o", "--output-dir",
+        required=True,
+        help="Directory for the compiled GeoJSON files"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild every workbook even if unchanged"
+    )
+
+    args = parser.parse_args()
+
+    workbook_paths = sorted({p for pattern in args.workbooks for p in glob.glob(pattern)})
+    # Skip Excel's lock files for workbooks that are open.
+    workbook_paths = [p for p in workbook_paths if not os.path.basename(p).startswith("~$")]
+    if not workbook_paths:
+        parser.error("No workbooks matched.")
+
+    compile_landmarks(workbook_paths, args.output_dir, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
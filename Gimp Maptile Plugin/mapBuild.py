@@ -0,0 +1,306 @@
+import os
+import sys
+import glob
+import json
+import fnmatch
+import time
+import hashlib
+import argparse
+import threading
+import subprocess
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+CACHE_FILE = ".mapbuild-cache.json"
+LOG_DIR = ".mapbuild-logs"
+
+# Bump when the way steps are keyed changes, so every step is rebuilt once.
+BUILD_VERSION = 1
+
+# Lines of a failed step's output shown on the console; the rest is in its log file.
+FAILURE_LINES = 20
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _normalize(path):
+    return os.path.normcase(os.path.normpath(path))
+
+
+def load_project(project_file):
+    """
+    Read a project file: {"steps": {name: step}}, where a step has a "command"
+    (a list of arguments; "python" runs this Python), the "inputs" it reads and
+    the "outputs" it writes (files, directories or glob patterns, relative to
+    the project file), and optionally "after", steps it must follow that are
+    not implied by its inputs. Raises ValueError if the project is invalid.
+    """
+    with open(project_file, "r") as f:
+        project = json.load(f)
+
+    steps = project.get("steps")
+    if not isinstance(steps, dict) or not steps:
+        raise ValueError(f"{project_file}: expected a \"steps\" object")
+    for name, step in steps.items():
+        if not isinstance(step.get("command"), list) or not step["command"]:
+            raise ValueError(f"Step '{name}': \"command\" must be a non-empty list of arguments")
+        if not step.get("outputs"):
+            raise ValueError(f"Step '{name}': \"outputs\" must list what the step writes")
+        step.setdefault("inputs", [])
+        step.setdefault("after", [])
+        for other in step["after"]:
+            if other not in steps:
+                raise ValueError(f"Step '{name}': unknown step '{other}' in \"after\"")
+    return steps
+
+
+def dependencies(steps):
+    """
+    The steps each step depends on: those listed in its "after", and those
+    writing a file or directory it reads. Raises ValueError on a cycle.
+    """
+    outputs = {name: [_normalize(path) for path in step["outputs"]] for name, step in steps.items()}
+    needs = {}
+    for name, step in steps.items():
+        needs[name] = set(step["after"])
+        for pattern in step["inputs"]:
+            wanted = _normalize(pattern)
+            for other, paths in outputs.items():
+                if other == name:
+                    continue
+                if any(wanted == path or wanted.startswith(path + os.sep) or fnmatch.fnmatch(path, wanted)
+                       for path in paths):
+                    needs[name].add(other)
+
+    order = topological_order(needs)
+    if len(order) != len(steps):
+        raise ValueError("Dependency cycle among steps: " + ", ".join(sorted(set(steps) - set(order))))
+    return needs
+
+
+def topological_order(needs):
+    """The steps ordered so each comes after the steps it needs; steps in a cycle are left out."""
+    remaining = {name: set(deps) for name, deps in needs.items()}
+    order = []
+    ready = sorted(name for name, deps in remaining.items() if not deps)
+    while ready:
+        name = ready.pop(0)
+        order.append(name)
+        for other, deps in remaining.items():
+            if name in deps:
+                deps.discard(name)
+                if not deps and other not in order and other not in ready:
+                    ready.append(other)
+    return order
+
+
+def expand(patterns, base_dir):
+    """Every file matched by a list of files, directories and glob patterns, relative to base_dir, sorted."""
+    files = set()
+    for pattern in patterns:
+        matches = glob.glob(os.path.join(base_dir, pattern), recursive=True)
+        if not matches:
+            raise FileNotFoundError(f"No file matches '{pattern}'")
+        for match in matches:
+            if os.path.isdir(match):
+                for root, _, names in os.walk(match):
+                    files.update(os.path.join(root, n) for n in names)
+            else:
+                files.add(match)
+    return sorted(_relative(f, base_dir) for f in files)
+
+
+def _relative(path, base_dir):
+    try:
+        return os.path.relpath(path, base_dir)
+    except ValueError:  # On another drive than the project on Windows.
+        return path
+
+
+class BuildCache:
+    """
+    What the last build knew, kept in CACHE_FILE next to the project file: the
+    key each step was last built with, and the hash of every input file along
+    with the size and modification time it was hashed at, so unchanged files
+    (such as multi-gigabyte map images) are not read again.
+    """
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self.path = os.path.join(base_dir, CACHE_FILE)
+        self.lock = threading.Lock()
+        data = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        if data.get("version") != BUILD_VERSION:
+            data = {}
+        self.files = data.get("files", {})
+        self.steps = data.get("steps", {})
+
+    def hash(self, path):
+        """The SHA-256 of a file given relative to the project, hashing it only if it changed."""
+        full_path = os.path.join(self.base_dir, path)
+        stat = os.stat(full_path)
+        with self.lock:
+            known = self.files.get(path)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+        digest = file_hash(full_path)
+        with self.lock:
+            self.files[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def save(self):
+        with self.lock:
+            data = {"version": BUILD_VERSION, "files": self.files, "steps": self.steps}
+            with open(self.path + ".tmp", "w") as f:
+                json.dump(data, f, indent=1)
+            os.replace(self.path + ".tmp", self.path)
+
+
+def step_key(step, base_dir, cache):
+    """Hash of a step's command and the contents of all its inputs: the step needs to run again if it changes."""
+    inputs = [[path, cache.hash(path)] for path in expand(step["inputs"], base_dir)]
+    description = json.dumps({"command": step["command"], "inputs": inputs}, sort_keys=True)
+    return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+
+def outputs_exist(step, base_dir):
+    return all(glob.glob(os.path.join(base_dir, pattern), recursive=True) for pattern in step["outputs"])
+
+
+def run_step(name, step, base_dir, cache, force=False):
+    """
+    Runs a step unless its key matches the last successful build and its
+    outputs are still there. Returns "cached" or "built"; raises RuntimeError if it fails.
+    """
+    key = step_key(step, base_dir, cache)
+    if not force and cache.steps.get(name, {}).get("key") == key and outputs_exist(step, base_dir):
+        return "cached"
+
+    for pattern in step["outputs"]:
+        parent = os.path.dirname(os.path.join(base_dir, pattern))
+        if not glob.has_magic(pattern) and parent:
+            os.makedirs(parent, exist_ok=True)
+
+    print(f"[{name}] running {' '.join(step['command'])}")
+    program, *arguments = step["command"]
+    command = [sys.executable if program == "python" else program] + arguments
+    log_path = os.path.join(base_dir, LOG_DIR, f"{name}.log")
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, "w") as log:
+        status = subprocess.run(command, cwd=base_dir, stdout=log, stderr=subprocess.STDOUT).returncode
+
+    if status != 0:
+        with open(log_path, "r", errors="replace") as log:
+            tail = "".join(log.readlines()[-FAILURE_LINES:])
+        raise RuntimeError(f"exited with status {status}; see {log_path}\n{tail}")
+    if not outputs_exist(step, base_dir):
+        raise RuntimeError(f"finished without writing all of {', '.join(step['outputs'])}")
+
+    with cache.lock:
+        cache.steps[name] = {"key": key, "built": time.strftime("%Y-%m-%d %H:%M:%S")}
+    cache.save()
+    return "built"
+
+
+def selected_steps(targets, needs):
+    """The target steps and everything they depend on; every step if no targets are given."""
+    if not targets:
+        return set(needs)
+    selected = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(needs[name])
+    return selected
+
+
+def build(project_file, targets=(), jobs=None, force=False):
+    """
+    Builds the project's steps, running independent steps at the same time in
+    up to `jobs` processes. A step starts once all the steps it needs have
+    finished; a failed step stops the steps that need it but not the others.
+    Returns {step: "built", "cached", "failed" or "skipped"}.
+    """
+    base_dir = os.path.dirname(os.path.abspath(project_file))
+    steps = load_project(project_file)
+    for target in targets:
+        if target not in steps:
+            raise ValueError(f"Unknown step '{target}'")
+    needs = dependencies(steps)
+    selected = selected_steps(targets, needs)
+    cache = BuildCache(base_dir)
+
+    results = {}
+    running = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(jobs or os.cpu_count() or 1) as executor:
+        while len(results) < len(selected):
+            for name in topological_order({n: needs[n] & selected for n in selected}):
+                if name in results or name in running.values():
+                    continue
+                if any(results.get(dep) in ("failed", "skipped") for dep in needs[name]):
+                    results[name] = "skipped"
+                    print(f"[{name}] skipped: a step it needs failed")
+                elif all(results.get(dep) in ("built", "cached") for dep in needs[name]):
+                    running[executor.submit(run_step, name, steps[name], base_dir, cache, force)] = name
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                    print(f"[{name}] {results[name]} ({time.perf_counter() - start:.1f}s)")
+                except (RuntimeError, OSError) as e:
+                    results[name] = "failed"
+                    print(f"[{name}] failed: {e}")
+    cache.save()
+    return results
+
+
+# Example Usage:
+# python mapBuild.py mapBuild.json
+# python mapBuild.py mapBuild.json tiles --jobs 2
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Build the map from a project file describing each step (combineQuadrants.py,\n"
+            "leafletTiling.py or Tilemaker, svgToGeoJSON.py, GeoJsonAdjust.py, ...), its\n"
+            "inputs and outputs. A step runs again only if its command or the contents of\n"
+            "its inputs changed since it last succeeded; steps that do not depend on each\n"
+            "other run at the same time."
+        ),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("project", help="Project file (see mapBuild.json)")
+    parser.add_argument("targets", nargs="*", help="Steps to build, with the steps they need (default: all)")
+    parser.add_argument("-j", "--jobs", type=int, help="Steps run at the same time (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="Run the selected steps even if they are up to date")
+
+    args = parser.parse_args()
+    try:
+        results = build(args.project, args.targets, args.jobs, args.force)
+    except (ValueError, FileNotFoundError) as e:
+        parser.error(str(e))
+
+    counts = {}
+    for result in results.values():
+        counts[result] = counts.get(result, 0) + 1
+    print("Build finished: " + ", ".join(f"{count} {result}" for result, count in sorted(counts.items())))
+    sys.exit(1 if counts.get("failed") else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import json
+import glob
+import argparse
+import os
+import numpy as np
+import shapely
+from shapely.geometry import shape
+from GeoJsonAdjust import feature_name
+
+
+def load_features(geojson_files):
+    """
+    Read every Feature with a geometry from the given GeoJSON files.
+    Returns a list of (source file, feature) tuples. Files that are not valid
+    JSON (such as the Blank.geojson template) are reported and skipped.
+    """
+    loaded = []
+    for geojson_file in geojson_files:
+        with open(geojson_file, "r") as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                print(f"Skipping {geojson_file}: {e}")
+                continue
+        for feature in data.get("features", []):
+            if feature.get("geometry"):
+                loaded.append((geojson_file, feature))
+    return loaded
+
+
+class RegionIndex:
+    """
+    Spatial index over the region outlines and landmarks in a set of GeoJSON files.
+
+    Polygons are held in one STRtree for containment lookups, and point
+    landmarks in a second tree for nearest-neighbour lookups.
+    All queries take an (N, 2) array of x, y coordinates and are answered in
+    a single vectorized call.
+    """
+
+    def __init__(self, features):
+        self.records = []
+        geometries = []
+        for source, feature in features:
+            stem = os.path.splitext(os.path.basename(source))[0]
+            self.records.append({
+                "source": source,
+                "name": feature_name(feature.get("properties") or {}, stem),
+                "properties": feature.get("properties") or {},
+            })
+            geometries.append(shape(feature["geometry"]))
+
+        self.geometries = np.array(geometries, dtype=object)
+        shapely.prepare(self.geometries)
+
+        type_ids = shapely.get_type_id(self.geometries)
+        # 3 = Polygon, 6 = MultiPolygon; 0 = Point, 4 = MultiPoint
+        self.region_ids = np.flatnonzero(np.isin(type_ids, (3, 6)))
+        self.landmark_ids = np.flatnonzero(np.isin(type_ids, (0, 4)))
+        self.region_tree = shapely.STRtree(self.geometries[self.region_ids])
+        self.landmark_tree = shapely.STRtree(self.geometries[self.landmark_ids])
+
+    @classmethod
+    def from_files(cls, geojson_files):
+        return cls(load_features(geojson_files))
+
+    def containing_regions(self, coords):
+        """
+        For each point, return the list of record indices of the regions that contain it.
+        """
+        points = shapely.points(np.asarray(coords, dtype=float))
+        point_ids, tree_ids = self.region_tree.query(points, predicate="within")
+
+        result = [[] for _ in range(len(points))]
+        for point_id, tree_id in zip(point_ids, tree_ids):
+            result[point_id].append(int(self.region_ids[tree_id]))
+        return result
+
+    def nearest_landmarks(self, coords):
+        """
+        For each point, return (record index, distance) of the nearest Point
+        feature, or (None, None) if no landmarks are indexed. A landmark at
+        exactly the query location is the point itself and is skipped.
+        """
+        points = shapely.points(np.asarray(coords, dtype=float))
+        result = [(None, None)] * len(points)
+        if not len(self.landmark_ids):
+            return result
+
+        (point_ids, tree_ids), distances = self.landmark_tree.query_nearest(
+            points, return_distance=True, exclusive=True, all_matches=False
+        )
+        for point_id, tree_id, distance in zip(point_ids, tree_ids, distances):
+            result[point_id] = (int(self.landmark_ids[tree_id]), float(distance))
+        return result
+
+
+def point_features(geojson_file):
+    """Read the Point features from a GeoJSON file, returning (features, coords)."""
+    with open(geojson_file, "r") as f:
+        data = json.load(f)
+
+    features = [
+        f for f in data.get("features", [])
+        if (f.get("geometry") or {}).get("type") == "Point"
+    ]
+    coords = np.array(
+        [f["geometry"]["coordinates"][:2] for f in features], dtype=float
+    ).reshape(-1, 2)
+    return features, coords
+
+
+def enrich_points(index, features, coords):
+    """
+    Add "region" and "nearest" properties to each point feature.
+    Returns the names of points that fall outside every region.
+    """
+    regions = index.containing_regions(coords)
+    nearest = index.nearest_landmarks(coords)
+    orphans = []
+
+    for feature, region_ids, (nearest_id, distance) in zip(features, regions, nearest):
+        props = feature.setdefault("properties", {})
+        names = [index.records[r]["name"] for r in region_ids]
+        props["region"] = names
+        if nearest_id is not None:
+            props["nearest"] = index.records[nearest_id]["name"]
+            props["nearest-distance"] = round(distance, 2)
+        if not names:
+            orphans.append(feature_name(props, str(feature["geometry"]["coordinates"])))
+
+    return orphans
+
+
+# Example Usage:
+# python regionIndex.py ".\Locations\*.geojson" --points .\Locations\FreeCityLandmarks.json -o enriched.geojson
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Index region outlines from GeoJSON files and look up the containing\n"
+            "region and nearest feature for a set of landmark points."
+        ),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "regions",
+        nargs="+",
+        help="GeoJSON files (or glob patterns) holding region outlines"
+    )
+    parser.add_argument(
+        "--points",
+        required=True,
+        help="GeoJSON file of landmark Points to look up"
+    )
+    parser.add_argument(
+        "-o", "--output",
+        help="Write the points, with region/nearest properties added, to this file"
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="Exit with an error if any point falls outside every region"
+    )
+
+    args = parser.parse_args()
+
+    region_files = sorted({p for pattern in args.regions for p in glob.glob(pattern)})
+    index = RegionIndex.from_files(region_files)
+    print(f"Indexed {len(index.records)} features ({len(index.region_ids)} regions) from {len(region_files)} files")
+
+    features, coords = point_features(args.points)
+    orphans = enrich_points(index, features, coords)
+    print(f"Looked up {len(features)} points; {len(orphans)} outside every region")
+    for name in orphans:
+        print(f"  Not in any region: {name}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"type": "FeatureCollection", "features": features}, f, indent=2)
+
+    if args.strict and orphans:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import os
+import re
+import glob
+import json
+import math
+import argparse
+import unicodedata
+from GeoJsonAdjust import JSON_ERRORS, feature_name, geometry_bbox, iter_features
+
+PREFIX_LENGTH = 2
+MIN_ZOOM = 3
+MAX_ZOOM = 8
+VIEWPORT_PIXELS = 800
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse everything but letters and digits to single spaces."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def zoom_for_bbox(bbox, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, viewport=VIEWPORT_PIXELS):
+    """
+    Pick the deepest zoom at which a bbox fits in the viewport.
+    At zoom z the map page draws 2^z / 256 pixels per map unit (1:1 at zoom 8).
+    """
+    extent = max(bbox[2] - bbox[0], bbox[3] - bbox[1])
+    if extent <= 0:
+        return max_zoom
+    zoom = math.floor(math.log2(viewport * 256 / extent))
+    return min(max(zoom, min_zoom), max_zoom)
+
+
+def build_index(geojson_files, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """
+    Collect a named entry for every feature, with the point to center on and
+    the zoom to show it at, plus word-prefix and trigram lookup tables.
+
+    Entries are [name, x, y, zoom, source file]; the lookup tables map keys to
+    lists of entry numbers. x and y are the map page's lng and lat. Files that
+    are not valid JSON (such as the Blank.geojson template) are reported and
+    skipped.
+    """
+    entries = []
+    prefixes = {}
+    grams = {}
+
+    for geojson_file in geojson_files:
+        source = os.path.splitext(os.path.basename(geojson_file))[0]
+        # Read the whole file before indexing it, so a file that fails part way
+        # through adds no entries.
+        named = []
+        try:
+            for feature in iter_features(geojson_file):
+                name = feature_name(feature.get("properties") or {})
+                bbox = geometry_bbox(feature.get("geometry"))
+                if normalize(name) and bbox is not None:
+                    named.append((name, bbox))
+        except JSON_ERRORS as e:
+            print(f"Skipping {geojson_file}: {e}")
+            continue
+
+        for name, bbox in named:
+            key = normalize(name)
+            x = round((bbox[0] + bbox[2]) / 2.0, 1)
+            y = round((bbox[1] + bbox[3]) / 2.0, 1)
+            entry_id = len(entries)
+            entries.append([name, x, y, zoom_for_bbox(bbox, min_zoom, max_zoom), source])
+
+            for prefix in {w[:n] for w in key.split() for n in range(1, PREFIX_LENGTH + 1)}:
+                prefixes.setdefault(prefix, []).append(entry_id)
+            for gram in trigrams(key):
+                grams.setdefault(gram, []).append(entry_id)
+
+    return {
+        "version": 1,
+        "prefixLength": PREFIX_LENGTH,
+        "entries": entries,
+        "prefixes": prefixes,
+        "trigrams": grams,
+    }
+
+
+def search(index, query, limit=10):
+    """
+    Answer a query the way the map page would. Each query word narrows the
+    candidates: short words by word prefix, longer ones by intersecting their
+    trigram lists. Candidates are then checked to contain every query word.
+    """
+    words = normalize(query).split()
+    if not words:
+        return []
+
+    candidates = None
+    for word in words:
+        if len(word) < 3:
+            ids = set(index["prefixes"].get(word[:index["prefixLength"]], []))
+        else:
+            lists = [index["trigrams"].get(g, []) for g in trigrams(word)]
+            ids = set(min(lists, key=len))
+            for gram_ids in lists:
+                ids.intersection_update(gram_ids)
+        candidates = ids if candidates is None else candidates & ids
+
+    entries = index["entries"]
+    matches = []
+    for i in sorted(candidates):
+        name = normalize(entries[i][0])
+        if all(word in name for word in words):
+            matches.append((not name.startswith(words[0]), len(name), entries[i]))
+
+    # Names starting with the first query word rank ahead of those merely containing it.
+    matches.sort(key=lambda m: m[:2])
+    return [m[2] for m in matches[:limit]]
+
+
+# Example Usage:
+# python searchIndex.py ".\Locations\*.geojson" ".\Locations\landmarks\*.geojson" -o search-index.json
+# python searchIndex.py --load search-index.json --query mourl
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Build a compact name search index over GeoJSON FeatureCollections.\n"
+            "Names come from each feature's popup-text (or name property)."
+        ),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        help="Input GeoJSON files or glob patterns"
+    )
+    parser.add_argument(
+        "-o", "--output",
+        default="search-index.json",
+        help="Output index file (default: search-index.json)"
+    )
+    parser.add_argument(
+        "--minzoom",
+        type=int,
+        default=MIN_ZOOM,
+        help=f"Smallest zoom to send a result to (default: {MIN_ZOOM})"
+    )
+    parser.add_argument(
+        "--maxzoom",
+        type=int,
+        default=MAX_ZOOM,
+        help=f"Largest zoom to send a result to; used for points (default: {MAX_ZOOM})"
+    )
+    parser.add_argument(
+        "--load",
+        help="Use an existing index file instead of building one"
+    )
+    parser.add_argument(
+        "--query",
+        help="Print the results for this query from the index"
+    )
+
+    args = parser.parse_args()
+
+    if args.load:
+        with open(args.load, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    else:
+        input_files = sorted({p for pattern in args.inputs for p in glob.glob(pattern)})
+        if not input_files:
+            parser.error("No input files matched.")
+
+        index = build_index(input_files, args.minzoom, args.maxzoom)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(index, f, separators=(",", ":"), ensure_ascii=False)
+        print(f"Indexed {len(index['entries'])} names from {len(input_files)} files into {args.output}")
+
+    if args.query:
+        for name, x, y, zoom, source in search(index, args.query):
+            print(f"{name} ({source}): lng={x}, lat={y}, zoom={zoom}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 import json
 import argparse
-from svgpathtools import svg2paths
+import xml.etree.ElementTree as ET
+from svgpathtools import svg2paths, parse_path
+from svgpathtools.svg_to_paths import (
+    ellipse2pathd, line2pathd, polygon2pathd, polyline2pathd, rect2pathd
+)
 from shapely.geometry import Polygon, MultiPolygon
+from GeoJsonAdjust import write_feature_collection
 
 def svg_path_to_geojson(path_data, svg_size, offset_x=0.0, offset_y=0.0):
     """
@@ -70,8 +75,72 @@ def svg_to_geojson(svg_file, geojson_file, svg_size, offset_x=0.0, offset_y=0.0)
     with open(geojson_file, 'w') as f:
         json.dump(geojson, f, indent=2)
 
+# Converters used to turn each supported SVG shape element into path data,
+# mirroring what svg2paths does by default.
+SHAPE_TO_PATHD = {
+    "path": lambda attrib: attrib.get("d", ""),
+    "polyline": polyline2pathd,
+    "polygon": polygon2pathd,
+    "line": line2pathd,
+    "ellipse": ellipse2pathd,
+    "circle": ellipse2pathd,
+    "rect": rect2pathd,
+}
+
+def iter_svg_features(svg_file, svg_size, offset_x=0.0, offset_y=0.0):
+    """
+    Yield GeoJSON Features for the shapes in an SVG file one at a time.
+
+    The file is walked incrementally with iterparse, and each element is
+    cleared once converted, so memory use does not grow with file size.
+
+    Features come out in document order, whereas svg2paths groups shapes by
+    element type (every <path> first, then the other shapes). The output
+    matches svg_to_geojson feature for feature only when the SVG holds <path>
+    elements alone; otherwise the same features are written in another order.
+    """
+    context = ET.iterparse(svg_file, events=("start", "end"))
+    _, root = next(context)
+
+    for event, elem in context:
+        if event != "end":
+            continue
+
+        # Strip the "{namespace}" prefix ElementTree adds to tag names.
+        tag = elem.tag.rsplit("}", 1)[-1]
+        to_pathd = SHAPE_TO_PATHD.get(tag)
+
+        if to_pathd is not None:
+            path_d = to_pathd(elem.attrib)
+            if path_d:
+                geojson_geometry = svg_path_to_geojson(
+                    [parse_path(path_d)], svg_size, offset_x, offset_y
+                )
+                if geojson_geometry:
+                    yield {
+                        "type": "Feature",
+                        "geometry": geojson_geometry,
+                        "properties": {}
+                    }
+
+        # Release converted elements; the root keeps references otherwise.
+        elem.clear()
+        if elem is not root:
+            root.clear()
+
+def svg_to_geojson_streaming(svg_file, geojson_file, svg_size, offset_x=0.0, offset_y=0.0):
+    """
+    Streaming variant of svg_to_geojson for very large SVG exports.
+    Features are written to the output as soon as they are converted, in
+    document order (see iter_svg_features).
+    """
+    features = iter_svg_features(svg_file, svg_size, offset_x, offset_y)
+    write_feature_collection(features, geojson_file)
+
 # Example Usage:
 # python svgToGeoJSON.py .\locations\Aunea.svg -o .\locations\Aunea.geojson --size 81920 --offset-y -250 --offset-x +85
+# For very large exports, add --stream to convert paths incrementally:
+# python svgToGeoJSON.py .\locations\World.svg -o .\locations\World.geojson --size 81920 --stream
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description='Convert SVG to GeoJSON with center-based coordinates and optional translation.'
@@ -102,9 +171,20 @@ if __name__ == "__main__":
         help='Vertical offset AFTER centering (positive = north/up, negative = south/down)'
     )
 
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help=(
+            'Parse the SVG incrementally and write features as they are produced (for very large files). '
+            'Features are written in document order rather than grouped by element type, '
+            'so the output differs in order from the default for SVGs with shapes other than <path>'
+        )
+    )
+
     args = parser.parse_args()
 
-    svg_to_geojson(
+    convert = svg_to_geojson_streaming if args.stream else svg_to_geojson
+    convert(
         args.input_svg,
         args.output,
         args.size,
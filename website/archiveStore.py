@@ -0,0 +1,290 @@
+import os
+import glob
+import gzip
+import sqlite3
+import argparse
+import threading
+from urllib.parse import urlparse
+from crawlStore import content_hash
+from pageDedup import canonical_link
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PACK_FILE = "pages.pack"
+INDEX_FILE = "index.db"
+PAGE_RECORD = b"MERISYL-PAGE"
+URL_RECORD = b"MERISYL-URL"
+ZSTD_LEVEL = 10
+GZIP_LEVEL = 6
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    digest TEXT NOT NULL
+);
+"""
+
+
+def _gzip_compress(data):
+    # mtime=0 keeps the output identical for identical pages.
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+CODECS = {"gzip": (_gzip_compress, gzip.decompress)}
+if zstandard is not None:
+    CODECS["zstd"] = (
+        lambda data: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+DEFAULT_CODEC = "zstd" if "zstd" in CODECS else "gzip"
+
+
+def save_html(content, filename):
+    """Saves the HTML content to a file."""
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def load_html(filename):
+    """Reads back a saved page."""
+    with open(filename, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def url_to_filename(url, output_dir):
+    """Maps a URL to the file its HTML is saved in, e.g. /deities/ator -> deities_ator.html."""
+    url_path = urlparse(url).path.strip("/")
+    filename = os.path.join(output_dir, f"{url_path.replace('/', '_') or 'index'}.html")
+    if urlparse(url).query:  # Handle query parameters
+        query_part = urlparse(url).query.replace('&', '_').replace('=', '-')
+        filename = filename.replace(".html", f"_{query_part}.html")
+    return filename
+
+
+def directory_pages(pages_dir):
+    """
+    (source, url, html) of every page saved in a crawled_pages directory. Copies
+    of a page saved under several names (by crawls before URLs were
+    canonicalized) are read once, from the shortest name.
+    """
+    urls = set()
+    for filename in sorted(glob.glob(os.path.join(pages_dir, "*.html")), key=lambda name: (len(name), name)):
+        content = load_html(filename)
+        url = canonical_link("", content)
+        if url is not None:
+            if url in urls:
+                continue
+            urls.add(url)
+        yield os.path.basename(filename), url, content
+
+
+def archive_pages(archive):
+    """(source, url, html) of every page in a PackArchive."""
+    for url in archive.urls():
+        yield url, url, archive.get(url)
+
+
+class DirectoryArchive:
+    """Pages saved as one uncompressed .html file each, named after their URL."""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+
+    def has(self, url):
+        return os.path.exists(url_to_filename(url, self.output_dir))
+
+    def get(self, url):
+        return load_html(url_to_filename(url, self.output_dir))
+
+    def put(self, url, content):
+        """Saves a page; returns where it was saved."""
+        filename = url_to_filename(url, self.output_dir)
+        save_html(content, filename)
+        return os.path.basename(filename)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class PackArchive:
+    """
+    Pages stored compressed in a single append-only pack file, once per distinct content.
+
+    A page record is a header line "MERISYL-PAGE <sha256> <codec> <length>",
+    the compressed page and a newline. Each time a URL is stored with new
+    content, a line "MERISYL-URL <sha256> <url>" follows, so the pack can be
+    read (or its index rebuilt) on its own. index.db maps each digest to its
+    record's offset, and each URL to the digest of its latest content, for
+    random reads.
+
+    commit() flushes the pack before committing the index, so the index never
+    points past the end of the pack.
+    """
+
+    def __init__(self, directory, codec=DEFAULT_CODEC):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec '{codec}'; available: {', '.join(sorted(CODECS))}")
+        self.directory = directory
+        self.codec = codec
+        os.makedirs(directory, exist_ok=True)
+
+        self.index = sqlite3.connect(os.path.join(directory, INDEX_FILE), check_same_thread=False)
+        self.index.executescript(SCHEMA)
+        self.pack = open(os.path.join(directory, PACK_FILE), "a+b")
+        self.pack.seek(0, os.SEEK_END)
+        self.lock = threading.Lock()
+
+    def has(self, url):
+        return self.digest(url) is not None
+
+    def digest(self, url):
+        row = self.index.execute("SELECT digest FROM urls WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def urls(self):
+        return [row[0] for row in self.index.execute("SELECT url FROM urls ORDER BY url")]
+
+    def put(self, url, content):
+        """Stores a page, writing its content only if no page had the same content. Returns the digest."""
+        digest = content_hash(content)
+        current = self.digest(url)
+        with self.lock:
+            if current == digest:
+                return digest
+            known = self.index.execute("SELECT 1 FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if not known:
+                data = content.encode("utf-8")
+                compressed = CODECS[self.codec][0](data)
+                self.pack.seek(0, os.SEEK_END)
+                self.pack.write(b"%s %s %s %d\n" % (PAGE_RECORD, digest.encode(), self.codec.encode(), len(compressed)))
+                offset = self.pack.tell()
+                self.pack.write(compressed + b"\n")
+                self.index.execute(
+                    "INSERT INTO blobs (digest, codec, offset, length, size) VALUES (?, ?, ?, ?, ?)",
+                    (digest, self.codec, offset, len(compressed), len(data))
+                )
+            self.pack.write(b"%s %s %s\n" % (URL_RECORD, digest.encode(), url.encode("utf-8")))
+            self.index.execute("INSERT OR REPLACE INTO urls (url, digest) VALUES (?, ?)", (url, digest))
+        return digest
+
+    def get_blob(self, digest):
+        row = self.index.execute("SELECT codec, offset, length FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            raise KeyError(digest)
+        codec, offset, length = row
+        with self.lock:
+            self.pack.flush()
+            self.pack.seek(offset)
+            compressed = self.pack.read(length)
+        return CODECS[codec][1](compressed).decode("utf-8")
+
+    def get(self, url):
+        digest = self.digest(url)
+        if digest is None:
+            raise KeyError(url)
+        return self.get_blob(digest)
+
+    def stats(self):
+        pages, blobs, size, length = self.index.execute(
+            "SELECT (SELECT COUNT(*) FROM urls), COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length), 0) FROM blobs"
+        ).fetchone()
+        return {"pages": pages, "blobs": blobs, "size": size, "stored": length}
+
+    def export(self, output_dir):
+        """Writes every page out as a .html file named after its URL, as the crawler used to save them."""
+        for url in self.urls():
+            save_html(self.get(url), url_to_filename(url, output_dir))
+
+    def reindex(self):
+        """Rebuilds the index by scanning the pack, e.g. after losing index.db."""
+        with self.lock:
+            self.pack.flush()
+            self.pack.seek(0)
+            self.index.execute("DELETE FROM blobs")
+            self.index.execute("DELETE FROM urls")
+            while True:
+                header = self.pack.readline()
+                if not header:
+                    break
+                if header.startswith(URL_RECORD + b" "):
+                    _, digest, url = header.rstrip(b"\n").split(b" ", 2)
+                    self.index.execute(
+                        "INSERT OR REPLACE INTO urls (url, digest) VALUES (?, ?)", (url.decode("utf-8"), digest.decode())
+                    )
+                    continue
+                magic, digest, codec, length = header.split()
+                if magic != PAGE_RECORD:
+                    raise ValueError(f"Corrupt pack record at offset {self.pack.tell() - len(header)}")
+                offset = self.pack.tell()
+                data = CODECS[codec.decode()][1](self.pack.read(int(length)))
+                self.pack.read(1)
+                self.index.execute(
+                    "INSERT OR IGNORE INTO blobs (digest, codec, offset, length, size) VALUES (?, ?, ?, ?, ?)",
+                    (digest.decode(), codec.decode(), offset, int(length), len(data))
+                )
+            self.pack.seek(0, os.SEEK_END)
+        self.commit()
+
+    def commit(self):
+        with self.lock:
+            self.pack.flush()
+            os.fsync(self.pack.fileno())
+            self.index.commit()
+
+    def close(self):
+        self.commit()
+        self.pack.close()
+        self.index.close()
+
+
+# Example Usage:
+# python archiveStore.py archive stats
+# python archiveStore.py archive get https://merisyl.com/deities/ator
+# python archiveStore.py archive export crawled_pages
+def main():
+    parser = argparse.ArgumentParser(description="Read pages from a compressed crawl archive.")
+    parser.add_argument("archive", help="Archive directory (as given to bruteForceArchive.py --archive)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Show how many pages are stored and how much space they take")
+    get = commands.add_parser("get", help="Print the stored HTML of a URL")
+    get.add_argument("url")
+    export = commands.add_parser("export", help="Write every page out as a .html file")
+    export.add_argument("output_dir")
+    commands.add_parser("reindex", help="Rebuild the index of the pack file")
+
+    args = parser.parse_args()
+    archive = PackArchive(args.archive)
+    try:
+        if args.command == "stats":
+            stats = archive.stats()
+            print(f"{stats['pages']} pages, {stats['blobs']} distinct; "
+                  f"{stats['size']:,} bytes of HTML stored in {stats['stored']:,} bytes")
+        elif args.command == "get":
+            print(archive.get(args.url))
+        elif args.command == "export":
+            archive.export(args.output_dir)
+            print(f"Exported {len(archive.urls())} pages to {args.output_dir}")
+        elif args.command == "reindex":
+            archive.reindex()
+            print(f"Reindexed {archive.stats()['blobs']} records")
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import os
+import re
+import asyncio
+import hashlib
+import argparse
+import mimetypes
+import aiohttp
+import lxml.html
+from urllib.parse import urljoin, urlparse, urldefrag
+from archiveStore import DirectoryArchive, PackArchive, url_to_filename
+from crawlStore import CrawlStore, DEFAULT_STORE
+from pageDedup import canonicalize_url
+
+ASSET_DIR = "assets"
+DEFAULT_CONCURRENCY = 16
+HTTP_TIMEOUT = 60
+
+# (tag, attribute) pairs that load an asset, and the <link rel> values that do.
+ASSET_ATTRIBUTES = {
+    ("img", "src"), ("script", "src"), ("source", "src"), ("video", "src"), ("video", "poster"),
+    ("audio", "src"), ("input", "src"), ("embed", "src"), ("object", "data"),
+}
+ASSET_RELS = {"stylesheet", "icon", "shortcut", "preload", "apple-touch-icon", "image_src", "mask-icon"}
+
+CSS_URL_PATTERN = re.compile(r"""url\(\s*(['"]?)([^'")]+?)\1\s*\)|@import\s+(['"])([^'"]+)\3""")
+
+
+def is_asset(element, attribute):
+    """True if a link found by lxml's iterlinks() loads an asset rather than navigating."""
+    if element.tag == "link":
+        return bool(set(element.get("rel", "").lower().split()) & ASSET_RELS)
+    if attribute is None or attribute == "style":
+        # url() references inside a <style> block or style attribute.
+        return True
+    return (element.tag, attribute) in ASSET_ATTRIBUTES
+
+
+def parse_page(url, content):
+    """Parses an archived page with every link made absolute."""
+    document = lxml.html.document_fromstring(content.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8"))
+    document.make_links_absolute(url, resolve_base_href=True, handle_failures="ignore")
+    return document
+
+
+def page_assets(document):
+    """The absolute URLs of the assets a parsed page loads."""
+    return {
+        link for element, attribute, link, _ in document.iterlinks()
+        if is_asset(element, attribute) and urlparse(link).scheme in ("http", "https")
+    }
+
+
+def css_references(css, css_url):
+    """The absolute URLs referenced by url() and @import in a stylesheet."""
+    references = set()
+    for match in CSS_URL_PATTERN.finditer(css):
+        reference = (match.group(2) or match.group(4)).strip()
+        if not reference.startswith("data:"):
+            references.add(urljoin(css_url, reference))
+    return references
+
+
+def asset_path(digest, url, content_type):
+    """Content-addressed path of an asset, keeping an extension so browsers know what it is offline."""
+    extension = os.path.splitext(urlparse(url).path)[1].lower()
+    if not re.fullmatch(r"\.[a-z0-9]{1,5}", extension):
+        extension = mimetypes.guess_extension(content_type.split(";")[0].strip()) or ""
+    return f"{ASSET_DIR}/{digest[:2]}/{digest}{extension}"
+
+
+def write_if_changed(path, data):
+    """Writes bytes to a file unless it already holds exactly them. Returns True if written."""
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return True
+
+
+async def download_assets(urls, snapshot_dir, store, concurrency, refresh=False):
+    """
+    Downloads assets in parallel over at most `concurrency` connections.
+
+    Each asset is saved once per distinct content under assets/<digest>, however
+    many URLs serve it. Assets downloaded by an earlier run are reused unless
+    `refresh` is set. Returns {url: path relative to snapshot_dir}.
+    """
+    paths = {}
+    by_digest = {}
+    todo = []
+    for url in sorted(urls):
+        record = store.asset(url)
+        if record is not None and record["path"]:
+            by_digest[record["digest"]] = record["path"]
+            if not refresh and os.path.exists(os.path.join(snapshot_dir, record["path"])):
+                paths[url] = record["path"]
+                continue
+        todo.append(url)
+
+    async def fetch(session, url):
+        try:
+            async with session.get(url) as response:
+                if response.status >= 400:
+                    store.record_asset(url, None, None, None, f"HTTP {response.status}")
+                    return
+                content_type = response.headers.get("Content-Type", "")
+                data = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            store.record_asset(url, None, None, None, repr(e))
+            return
+
+        digest = hashlib.sha256(data).hexdigest()
+        path = by_digest.setdefault(digest, asset_path(digest, url, content_type))
+        write_if_changed(os.path.join(snapshot_dir, path), data)
+        store.record_asset(url, digest, path, content_type)
+        paths[url] = path
+
+    timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        await asyncio.gather(*(fetch(session, url) for url in todo))
+    store.commit()
+    return paths
+
+
+def relative_link(path, from_path):
+    """The link from one file in the snapshot to another, both given relative to the snapshot root."""
+    return os.path.relpath(path, os.path.dirname(from_path) or ".").replace(os.sep, "/")
+
+
+def localized_css_path(css_path, css_url):
+    """
+    Where the localized copy of a stylesheet is written, next to the downloaded
+    one so that the content-addressed file keeps matching its digest. Relative
+    url()s resolve against the stylesheet's directory, so the same file served
+    from another directory gets a copy of its own.
+    """
+    base = hashlib.sha256(urljoin(css_url, ".").encode("utf-8")).hexdigest()[:12]
+    return f"{os.path.splitext(css_path)[0]}.{base}.css"
+
+
+def localize_css(css_path, css_url, snapshot_dir, links):
+    """
+    Writes a copy of a downloaded stylesheet with its url() and @import references
+    pointing at their local copies, given as {url: path}. Returns the copy's path.
+    """
+    with open(os.path.join(snapshot_dir, css_path), "r", encoding="utf-8", errors="replace") as f:
+        css = f.read()
+    local_path = localized_css_path(css_path, css_url)
+
+    def replace(match):
+        quote, reference = (match.group(1), match.group(2)) if match.group(2) else (match.group(3), match.group(4))
+        target = links.get(urljoin(css_url, reference.strip()))
+        if target is None:
+            return match.group(0)
+        local = relative_link(target, local_path)
+        return f"url({quote}{local}{quote})" if match.group(2) else f"@import {quote}{local}{quote}"
+
+    write_if_changed(os.path.join(snapshot_dir, local_path), CSS_URL_PATTERN.sub(replace, css).encode("utf-8"))
+    return local_path
+
+
+def localize_page(document, page_path, assets, pages):
+    """
+    Rewrites a parsed page's asset links to their local copies and its links to
+    other archived pages to their local files. Returns the page's HTML.
+    """
+    def relink(link):
+        if link in assets:
+            return relative_link(assets[link], page_path)
+        target, fragment = urldefrag(link)
+        local = pages.get(canonicalize_url(target))
+        if local is not None:
+            return relative_link(local, page_path) + (f"#{fragment}" if fragment else "")
+        return link
+
+    document.rewrite_links(relink, resolve_base_href=False)
+    # lxml does not rewrite srcset, so leave browsers the (local) src instead.
+    for element in document.iter("img", "source"):
+        element.attrib.pop("srcset", None)
+
+    doctype = document.getroottree().docinfo.doctype
+    return lxml.html.tostring(document, encoding="unicode", doctype=doctype or None)
+
+
+async def build_snapshot(archive, store, snapshot_dir, concurrency=DEFAULT_CONCURRENCY, refresh=False):
+    """
+    Makes an offline snapshot of the archived pages in snapshot_dir: every page,
+    with its images, stylesheets, fonts and scripts downloaded to assets/ and
+    its links rewritten to the local copies.
+    """
+    urls = [url for url in store.archived_urls() if archive.has(url)]
+    pages = {url: os.path.basename(url_to_filename(url, "")) for url in urls}
+
+    documents = {}
+    wanted = set()
+    for url in urls:
+        documents[url] = parse_page(url, archive.get(url))
+        wanted |= page_assets(documents[url])
+
+    assets = await download_assets(wanted, snapshot_dir, store, concurrency, refresh)
+
+    # Stylesheets pull in fonts, images and other stylesheets of their own, so
+    # they are scanned until no new references turn up. Every stylesheet is
+    # scanned, not only the newly downloaded ones, so that references that
+    # failed in an earlier run are tried again.
+    def stylesheets():
+        return {
+            url: path for url, path in assets.items()
+            if path.endswith(".css") or (store.asset(url)["content_type"] or "").startswith("text/css")
+        }
+
+    nested = set()
+    scanned = set()
+    while True:
+        found = set()
+        for url, path in stylesheets().items():
+            if url in scanned:
+                continue
+            scanned.add(url)
+            with open(os.path.join(snapshot_dir, path), "r", encoding="utf-8", errors="replace") as f:
+                found |= css_references(f.read(), url)
+        found -= nested | set(assets)
+        if not found:
+            break
+        nested |= found
+        assets.update(await download_assets(found, snapshot_dir, store, concurrency, refresh))
+
+    # Pages and stylesheets link to the localized copy of a stylesheet, which
+    # must be known before the stylesheets importing it are localized.
+    css = stylesheets()
+    links = dict(assets)
+    links.update({url: localized_css_path(path, url) for url, path in css.items()})
+    for url, path in css.items():
+        localize_css(path, url, snapshot_dir, links)
+
+    written = 0
+    for url, document in documents.items():
+        html = localize_page(document, pages[url], links, pages)
+        written += write_if_changed(os.path.join(snapshot_dir, pages[url]), html.encode("utf-8"))
+
+    failed = len(wanted | nested) - len(assets)
+    print(f"Snapshot of {len(pages)} pages in {snapshot_dir}: {written} pages written, "
+          f"{len(assets)} assets ({len(set(assets.values()))} distinct files), {failed} assets failed")
+    return assets
+
+
+# Example Usage:
+# python assetArchive.py -o offline
+# python assetArchive.py --archive archive -o offline --concurrency 32
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Download the images, stylesheets, fonts and scripts of the archived pages\n"
+            "and write an offline snapshot with every link pointing at the local copies."
+        ),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("-o", "--output-dir", required=True, help="Directory for the offline snapshot")
+    parser.add_argument("--store", default=DEFAULT_STORE, help=f"Crawl database (default: {DEFAULT_STORE})")
+    parser.add_argument("--archive", help="Pack archive directory, if the pages were crawled with --archive")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Assets downloaded at once (default: {DEFAULT_CONCURRENCY})"
+    )
+    parser.add_argument("--refresh", action="store_true", help="Download assets again even if already saved")
+
+    args = parser.parse_args()
+
+    archive = PackArchive(args.archive) if args.archive else DirectoryArchive("crawled_pages")
+    store = CrawlStore(args.store)
+    try:
+        asyncio.run(build_snapshot(archive, store, args.output_dir, args.concurrency, args.refresh))
+    finally:
+        archive.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,49 @@
 import os
-import requests
+import json
+import time
+import asyncio
+import threading
+import aiohttp
 import argparse
+from archiveStore import CODECS, DEFAULT_CODEC, DirectoryArchive, PackArchive
+from crawlStore import CrawlStore, DEFAULT_STORE, DUPLICATE, FAILED, FETCHED, SKIPPED, content_hash
+from linkParsers import DEFAULT_PARSER, LINK_PARSERS, OUTDATED_PATTERNS, outdated_pattern
+from pageDedup import FingerprintIndex, canonical_link, canonicalize_url, content_fingerprint
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
+
+# Offline snapshots (--assets) parse pages with lxml.
+try:
+    from assetArchive import build_snapshot
+except ImportError:
+    build_snapshot = None
+
+# Crawl events are logged here as JSON lines.
+LOG_FILE = "output.jsonl"
+LOG_BUFFER = 1 << 20
+
+# Number of pages fetched over HTTP at the same time.
+DEFAULT_CONCURRENCY = 8
+HTTP_TIMEOUT = 30
+
+# Headless Chrome drivers for pages that need JavaScript, each replaced after RECYCLE_AFTER pages.
+DEFAULT_DRIVERS = 2
+RECYCLE_AFTER = 50
+RENDER_TIMEOUT = 10
+RENDER_POLL = 0.25
+
+# Markers of a page that only fills in its content with JavaScript.
+JAVASCRIPT_HINTS = (
+    "please enable javascript",
+    "requires javascript",
+    "<div id=\"root\"></div>",
+    "<div id=\"app\"></div>",
+)
 
 def setup_selenium():
     """Sets up the Selenium WebDriver with Chrome."""
@@ -17,138 +52,468 @@ def setup_selenium():
     options.add_argument("--disable-gpu")
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-dev-shm-usage")
-    
+    options.add_argument("--blink-settings=imagesEnabled=false")  # Only the HTML is saved
+    options.page_load_strategy = "eager"  # Return from get() once the DOM is parsed; PageSettled waits for the rest
+
     service = Service("./chromedriver.exe")  # Update with your chromedriver path
     driver = webdriver.Chrome(service=service, options=options)
     return driver
 
+class PageSettled:
+    """
+    Wait condition for a rendered page: the document has been parsed, jQuery has
+    no requests in flight, and the number of elements held still between two polls.
+    """
+    def __init__(self):
+        self.last_size = None
+
+    def __call__(self, driver):
+        state, active, size = driver.execute_script(
+            "return [document.readyState, window.jQuery ? jQuery.active : 0, document.getElementsByTagName('*').length];"
+        )
+        settled = state != "loading" and active == 0 and size == self.last_size
+        self.last_size = size
+        return settled
+
 def fetch_page_content(url, driver):
-    """Fetches the page content using Selenium."""
+    """Fetches the page content using Selenium, once the page has settled."""
     driver.get(url)
     try:
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.TAG_NAME, "body"))
-        )
+        WebDriverWait(driver, RENDER_TIMEOUT, poll_frequency=RENDER_POLL).until(PageSettled())
+    except TimeoutException:
+        # Pages that never stop changing (carousels, tickers) are saved as they stand.
+        print(f"Page {url} did not settle within {RENDER_TIMEOUT}s; saving it as rendered so far")
+    try:
         return driver.page_source
     except Exception as e:
         print(f"Error loading page {url}: {e}")
         return None
 
-def save_html(content, filename):
-    """Saves the HTML content to a file."""
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(content)
-
-def crawl(url, parent, base_domain, visited, output_dir, log_file, link_file, driver, verbose):
-    """Recursively crawls links within the same domain and logs output."""
-    if url in visited:
-        if verbose:
-            log_file.write(f"Skipping: {url} from {parent}\n")
-        return
+class DriverPool:
+    """
+    A pool of headless Chrome drivers for the pages that need JavaScript.
 
-    # This is output even if not verbose, to provide an indication of progress.
-    log_file.write(f"Crawling: {url} from {parent}\n")
-    
-    try:
-        # Fetch content using Selenium
-        page_content = fetch_page_content(url, driver)
+    Each pool thread owns one driver, started on first use and replaced after
+    `recycle_after` pages (or after it fails) to bound Chrome's memory growth.
+    Rendering requests from the crawl workers queue on the pool's executor.
+    """
+    def __init__(self, size=DEFAULT_DRIVERS, recycle_after=RECYCLE_AFTER):
+        self.recycle_after = recycle_after
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="selenium")
+        self.local = threading.local()
+        self.drivers = []
+        self.lock = threading.Lock()
+
+    def _start(self):
+        driver = setup_selenium()
+        with self.lock:
+            self.drivers.append(driver)
+        self.local.driver = driver
+        self.local.pages = 0
+        return driver
+
+    def _retire(self, driver):
+        with self.lock:
+            self.drivers.remove(driver)
+        self.local.driver = None
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"Error closing driver: {e}")
+
+    def _render(self, url):
+        driver = getattr(self.local, "driver", None)
+        if driver is not None and self.local.pages >= self.recycle_after:
+            self._retire(driver)
+            driver = None
+        if driver is None:
+            driver = self._start()
+
+        self.local.pages += 1
+        try:
+            return fetch_page_content(url, driver)
+        except Exception:
+            # A driver that failed mid-page may be left in any state; start afresh next time.
+            self._retire(driver)
+            raise
+
+    async def fetch(self, url):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._render, url)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            drivers, self.drivers = self.drivers, []
+        for driver in drivers:
+            driver.quit()  # Ensure the drivers are properly closed
+
+async def fetch_http(session, url, record=None):
+    """
+    Fetches a page over plain HTTP. Returns (status, final URL after redirects,
+    headers, content); content is None for error and 304 responses and for
+    anything that is not HTML.
+    If a stored record is given, the request is conditional on its ETag/Last-Modified.
+    """
+    headers = {}
+    if record is not None:
+        if record["etag"]:
+            headers["If-None-Match"] = record["etag"]
+        if record["last_modified"]:
+            headers["If-Modified-Since"] = record["last_modified"]
+
+    async with session.get(url, headers=headers) as response:
+        final_url = str(response.url)
+        if response.status >= 400 or response.status == 304:
+            return response.status, final_url, response.headers, None
+        if "html" not in response.headers.get("Content-Type", "text/html"):
+            return response.status, final_url, response.headers, None
+        return response.status, final_url, response.headers, await response.text(errors="replace")
+
+def needs_javascript(content):
+    """True if the fetched HTML looks like a shell that JavaScript fills in."""
+    lowered = content.lower()
+    if any(hint in lowered for hint in JAVASCRIPT_HINTS):
+        return True
+    # A page with scripts but not a single link has most likely not been rendered.
+    return "<script" in lowered and "<a " not in lowered
+
+def extract_links(url, page_content, base_domain, link_file, parser=DEFAULT_PARSER, outdated=None):
+    """
+    Finds the links on a page and logs those matching the outdated pattern. Returns (links, internal):
+    every link as a (raw href, resolved URL) pair, and the resolved URLs within the same domain.
+    """
+    find_links, link_text = LINK_PARSERS[parser]
+    links = []
+    internal = []
+    for raw_href, link in find_links(page_content):
+        # Extract href attribute
+        raw_href = raw_href.strip()
+        if not raw_href:
+            continue
+
+        # If href is already a full URL, use it directly
+        if raw_href.startswith("http://") or raw_href.startswith("https://"):
+            new_url = raw_href
+        else:
+            # Resolve relative URL using urljoin
+            new_url = urljoin(url, raw_href)
+
+        # Normalize the URL to avoid duplicates (e.g., "https://example.com/foo/" vs "https://example.com/gazette/foo#top")
+        new_url = canonicalize_url(new_url)
+        links.append((raw_href, new_url))
+
+        if outdated is not None and outdated.search(new_url):
+            link_file.write(f"On page {url}: Outdated link '{link_text(link)}' identified: {new_url}\n")
+
+        # Skip if not within the same domain
+        if urlparse(new_url).netloc != base_domain:
+            continue
+
+        internal.append(new_url)
+    return links, internal
+
+class CrawlLog:
+    """
+    Crawl events written as JSON lines through a large buffer, so logging stays
+    cheap even in verbose runs. Each line has the event's time and name plus its fields.
+    """
+    def __init__(self, path, mode="w"):
+        self.file = open(path, mode, encoding="utf-8", buffering=LOG_BUFFER)
+
+    def event(self, event, **fields):
+        self.file.write(json.dumps({"time": round(time.time(), 3), "event": event, **fields}) + "\n")
+
+    def close(self):
+        self.file.close()
+
+def elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+def start_frontier(store, start_url, options):
+    """
+    Prepares the store's frontier for this run. An unfinished crawl from the same
+    start URL is resumed, retrying its failures; with --retry-failed only the
+    failures of the last crawl are fetched again. Otherwise a new crawl begins.
+    """
+    if store.frontier_root() == start_url and not options.restart:
+        if options.retry_failed:
+            print(f"Retrying {store.requeue_failed()} failed pages of the last crawl")
+            return
+        queued = len(store.queued())
+        if queued:
+            retried = store.requeue_failed()
+            print(f"Resuming the crawl of {start_url}: {queued} pages queued, {retried} failures to retry")
+            return
+    store.reset_frontier(start_url)
+
+async def crawl(base_domain, archive, log, link_file, store, options):
+    """
+    Crawls every page within the same domain, breadth first, and logs output.
+
+    Pages are fetched over HTTP by `options.concurrency` workers sharing one
+    frontier; a page goes through the pool of Selenium drivers only if it needs
+    JavaScript (or `options.render` is set).
+
+    Pages are saved to `archive`: a DirectoryArchive of .html files or a
+    compressed PackArchive. Pages already in the store are requested
+    conditionally, and a page is only written when its content hash differs
+    from the stored one, so unchanged files keep their modification times.
+
+    URLs are canonicalized before they are queued. A fetched page is filed under
+    its redirect target or <link rel="canonical"> address, and is dropped if that
+    address, or a page with near-identical content, has already been archived.
+
+    The frontier is mirrored in the store, so the crawl starts from whatever
+    start_frontier() left queued there and remembers what was already archived.
+
+    Each page produces one "page" event in the log with its result and the time
+    spent fetching, fingerprinting, parsing and saving it.
+    """
+    outdated = outdated_pattern(options.outdated or OUTDATED_PATTERNS)
+    frontier = asyncio.Queue()
+    for url, parent in store.queued():
+        frontier.put_nowait((url, parent))
+    visited = store.known_urls()
+    claimed = set()
+    fingerprints = FingerprintIndex()
+    for url, fingerprint in store.fingerprints():
+        claimed.add(url)
+        fingerprints.add(fingerprint, url)
+    fallback = DriverPool(options.drivers, options.recycle_after)
+    counts = {"Written": 0, "Unchanged": 0, "Duplicate": 0, "Skipped": 0, "Failed": 0}
+
+    def stored(url):
+        record = store.get(url)
+        if record is not None and not archive.has(url):
+            record = None
+        return record
+
+    def claim(url, page_content):
+        """
+        Claims a canonical URL for a page. Returns None if another visit already
+        claimed it in this crawl; otherwise (duplicate, fingerprint), where
+        duplicate is the URL of a page with near-identical content, if any.
+        """
+        if url in claimed:
+            return None
+        claimed.add(url)
+        fingerprint = content_fingerprint(page_content)
+        duplicate = fingerprints.find(fingerprint)
+        if duplicate is None:
+            fingerprints.add(fingerprint, url)
+        return duplicate, fingerprint
+
+    def fail(page, url, error):
+        page["result"] = "failed"
+        page["error"] = error
+        counts["Failed"] += 1
+        store.mark(url, FAILED, error)
+
+    async def visit(session, url, page):
+        record = stored(url)
+        page_content = None
+        final_url = url
+        headers = {}
+        if not options.render:
+            start = time.perf_counter()
+            try:
+                status, final_url, headers, page_content = await fetch_http(session, url, None if options.full else record)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = None
+                page["http_error"] = repr(e)
+            page["status"] = status
+            page["fetch_ms"] = elapsed_ms(start)
+
+            if status == 304:
+                # Not modified since the last crawl: follow the links from the saved copy.
+                page["result"] = "not-modified"
+                counts["Unchanged"] += 1
+                page_content = archive.get(url)
+                claimed_page = claim(url, page_content)
+                store.mark(url, FETCHED, fingerprint=claimed_page and claimed_page[1])
+                queue_links(url, page_content, page)
+                return
+            if page_content is None and status is not None and status < 400:
+                # A link to a file rather than a page: nothing to archive, and no point retrying.
+                page["result"] = "skipped"
+                counts["Skipped"] += 1
+                store.mark(url, SKIPPED, f"Not a page ({headers.get('Content-Type', 'no Content-Type')})")
+                return
+            if page_content is None and status is not None:
+                fail(page, url, f"HTTP {status}")
+                return
+
+        if page_content is None or needs_javascript(page_content):
+            start = time.perf_counter()
+            page_content = await fallback.fetch(url)
+            page["render_ms"] = elapsed_ms(start)
+            headers = {}
         if not page_content:
-            log_file.write(f"Failed to fetch: {url}\n")
+            fail(page, url, "No content")
             return
+        page["bytes"] = len(page_content)
 
-        # Save the HTML content
-        url_path = urlparse(url).path.strip("/")
-        filename = os.path.join(output_dir, f"{url_path.replace('/', '_') or 'index'}.html")
-        if urlparse(url).query:  # Handle query parameters
-            query_part = urlparse(url).query.replace('&', '_').replace('=', '-')
-            filename = filename.replace(".html", f"_{query_part}.html")
-        
-        save_html(page_content, filename)
-
-        # Mark as visited
-        visited.add(url)
-
-        # Parse and find new links
-        soup = BeautifulSoup(page_content, "html.parser")
-        for link in soup.find_all("a"):
-            if verbose:
-                log_file.write(f"Full link tag: {link}\n")
-                log_file.write(f"Attributes of link: {link.attrs}\n")           
-            
-            # Extract href attribute
-            raw_href = link.attrs.get("href", "").strip()
-            
-            if not raw_href:
-                if verbose:
-                    log_file.write(f"Skipping link without href: {link}\n")
-                continue
+        # File the page under the address it gives for itself: its redirect target or canonical link.
+        requested = url
+        canonical = canonical_link(final_url, page_content) or canonicalize_url(final_url)
+        if canonical != url and urlparse(canonical).netloc == base_domain:
+            page["canonical"] = canonical
+            visited.add(canonical)
+            store.enqueue(canonical, requested)
+            store.mark(requested, FETCHED)
+            url = canonical
+            record = stored(url)
+
+        start = time.perf_counter()
+        claimed_page = claim(url, page_content)
+        page["dedup_ms"] = elapsed_ms(start)
+        if claimed_page is None:
+            # Another visit already archives this address (a redirect or canonical link led here
+            # twice); it keeps its own state, and only the address requested here is a duplicate.
+            page["result"] = "duplicate"
+            page["duplicate_of"] = url
+            counts["Duplicate"] += 1
+            if url != requested:
+                store.mark(requested, DUPLICATE, f"Duplicate of {url}")
+            return
+        duplicate, fingerprint = claimed_page
+        if duplicate is not None:
+            page["result"] = "duplicate"
+            page["duplicate_of"] = duplicate
+            counts["Duplicate"] += 1
+            store.mark(requested, DUPLICATE, f"Duplicate of {duplicate}")
+            if url != requested:
+                # The canonical address was enqueued above; don't leave it queued for the next run.
+                store.mark(url, DUPLICATE, f"Duplicate of {duplicate}")
+            return
 
-            if verbose:
-                # Log the found link and its resolved URL
-                log_file.write(f"Extracted (raw) href: {raw_href}\n") 
-            
-            # If href is already a full URL, use it directly
-            if raw_href.startswith("http://") or raw_href.startswith("https://"):
-                new_url = raw_href
-            else:
-                # Resolve relative URL using urljoin
-                new_url = urljoin(url, raw_href)
-
-            # Normalize the URL to avoid duplicates (e.g., "https://example.com/foo" vs "https://example.com/foo/")
-            new_url = new_url.rstrip("/")
-
-            if verbose:
-                log_file.write(f"Resolved URL: {new_url}\n")
-            
-            if "atlassian" in new_url.lower():
-                link_file.write(f"On page {url}: Outdated link '{link.get_text()}' identified: {new_url}\n")
-            
-            parsed_new_url = urlparse(new_url)
-
-            # Skip if not within the same domain
-            if parsed_new_url.netloc != base_domain:
+        # Save the HTML content, unless it is the same as the copy already saved
+        start = time.perf_counter()
+        digest = content_hash(page_content)
+        if record is not None and record["sha256"] == digest:
+            location = record["filename"]
+            page["result"] = "unchanged"
+            counts["Unchanged"] += 1
+        else:
+            location = archive.put(url, page_content)
+            page["result"] = "written"
+            counts["Written"] += 1
+        store.record(url, location, headers.get("ETag"), headers.get("Last-Modified"), digest)
+        store.mark(url, FETCHED, fingerprint=fingerprint)
+        page["save_ms"] = elapsed_ms(start)
+
+        queue_links(url, page_content, page)
+
+    def queue_links(url, page_content, page):
+        start = time.perf_counter()
+        links, internal = extract_links(url, page_content, base_domain, link_file, options.parser, outdated)
+        page["parse_ms"] = elapsed_ms(start)
+        page["links"] = len(links)
+
+        queued = 0
+        for new_url in internal:
+            if new_url in visited:
                 continue
+            visited.add(new_url)
+            store.enqueue(new_url, url)
+            frontier.put_nowait((new_url, url))
+            queued += 1
+        page["queued"] = queued
+        if options.verbose:
+            log.event("links", url=url, links=links)
 
-            # Add to crawl queue if not visited
-            if new_url not in visited:
-                crawl(new_url, url, base_domain, visited, output_dir, log_file, link_file, driver, verbose)
+    async def worker(session):
+        while True:
+            url, parent = await frontier.get()
+            page = {"url": url, "parent": parent}
+            start = time.perf_counter()
+            try:
+                await visit(session, url, page)
+            except Exception as e:
+                print(f"Error crawling {url}: {e}\n")
+                fail(page, url, str(e))
+            finally:
+                page["total_ms"] = elapsed_ms(start)
+                log.event("page", **page)
+                # All of a page's store updates are made by now, so a commit here never splits them.
+                store.checkpoint(archive.commit)
+                frontier.task_done()
 
-    except Exception as e:
-        print(f"Error crawling {url}: {e}\n")
+    timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+    connector = aiohttp.TCPConnector(limit=options.concurrency)
+    try:
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            workers = [asyncio.create_task(worker(session)) for _ in range(options.concurrency)]
+            await frontier.join()
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+    finally:
+        fallback.close()
+
+    print(f"Crawled {sum(counts.values())} pages: {counts['Written']} written, {counts['Unchanged']} unchanged, "
+          f"{counts['Duplicate']} duplicates, {counts['Skipped']} not pages, {counts['Failed']} failed")
+    return store.states()
 
-def main(verbose):
-    start_url = input("Enter the website homepage URL: ").strip()
+def main(options):
+    start_url = canonicalize_url(input("Enter the website homepage URL: ").strip())
     parsed_start = urlparse(start_url)
     base_domain = parsed_start.netloc
 
     if not base_domain:
         print("Invalid URL. Please provide a full URL (e.g., https://example.com).")
         return
-    
-    output_dir = "crawled_pages"
-    os.makedirs(output_dir, exist_ok=True)
-    
-    visited = set()
-    
-    # Setup Selenium driver
-    driver = setup_selenium()
-    
-    with open("output.log", "w", encoding="utf-8") as log_file, \
-        open("link.log", "w", encoding="utf-8") as link_file:
+
+    if options.archive:
+        archive = PackArchive(options.archive, options.codec)
+    else:
+        archive = DirectoryArchive("crawled_pages")
+
+    if options.assets and build_snapshot is None:
+        print("--assets needs lxml; install it with 'pip install lxml'.")
+        return
+
+    store = CrawlStore(options.store)
+    start_frontier(store, start_url, options)
+    # A resumed crawl adds to the logs of the run it continues.
+    mode = "a" if store.known_urls() != {start_url} else "w"
+    log = CrawlLog(LOG_FILE, mode)
+    log.event("start", url=start_url, parser=options.parser, concurrency=options.concurrency, render=options.render)
+    with open("link.log", mode, encoding="utf-8") as link_file:
         try:
-            crawl(start_url, "Root", base_domain, visited, output_dir, log_file, link_file, driver, verbose)
+            asyncio.run(crawl(base_domain, archive, log, link_file, store, options))
+            if options.assets:
+                archive.commit()
+                asyncio.run(build_snapshot(archive, store, options.assets, options.concurrency))
+        except KeyboardInterrupt:
+            print("Interrupted; run again to resume the crawl.")
         finally:
-            driver.quit()  # Ensure the driver is properly closed
+            log.event("end", states=store.states())
+            log.close()
+            archive.close()
+            store.close()
 
 # Usage example
 if __name__ == "__main__":
     # Set up argument parsing
     parser = argparse.ArgumentParser(description='Crawl a website and save its HTML.')
-    parser.add_argument("--verbose", help="increase output verbosity", action="store_true")
+    parser.add_argument("--verbose", help="also log every link found on each page", action="store_true")
+    parser.add_argument("--parser", choices=sorted(LINK_PARSERS), default=DEFAULT_PARSER, help=f"HTML parser used to find links (default: {DEFAULT_PARSER})")
+    parser.add_argument("--outdated", action="append", metavar="PATTERN", help=f"log links whose URL matches this regular expression to link.log; may be repeated (default: {' '.join(OUTDATED_PATTERNS)})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help=f"number of pages fetched at once (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--render", help="render every page with Selenium instead of only those needing JavaScript", action="store_true")
+    parser.add_argument("--drivers", type=int, default=DEFAULT_DRIVERS, help=f"number of headless Chrome drivers for rendering (default: {DEFAULT_DRIVERS})")
+    parser.add_argument("--recycle-after", type=int, default=RECYCLE_AFTER, help=f"pages rendered by a driver before it is replaced (default: {RECYCLE_AFTER})")
+    parser.add_argument("--archive", help="store pages compressed in a pack file in this directory instead of as .html files in crawled_pages")
+    parser.add_argument("--codec", choices=sorted(CODECS), default=DEFAULT_CODEC, help=f"compression for --archive (default: {DEFAULT_CODEC})")
+    parser.add_argument("--store", default=DEFAULT_STORE, help=f"database recording what has been archived, for incremental re-crawls (default: {DEFAULT_STORE})")
+    parser.add_argument("--assets", metavar="DIR", help="after the crawl, download each page's images, stylesheets, fonts and scripts and write an offline snapshot to DIR")
+    parser.add_argument("--full", help="re-download every page instead of sending conditional requests", action="store_true")
+    parser.add_argument("--restart", help="start a new crawl even if the last one did not finish", action="store_true")
+    parser.add_argument("--retry-failed", help="only fetch again the pages that failed in the last crawl", action="store_true")
     parser.set_defaults(verbose=False)
-    
+
     # Parse arguments
     args = parser.parse_args()
-    
-    main(args.verbose)
+
+    main(args)
@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from archiveStore import load_html, url_to_filename
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak memory is then not reported.
+    resource = None
+
+CRAWLER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bruteForceArchive.py")
+DEFAULT_PAGES_DIR = "crawled_pages"
+# The archived pages link to the live site; they are served with this replaced by the local server's address.
+SITE_ORIGIN = "https://merisyl.com"
+
+DEFAULT_SYNTHETIC_PAGES = 500
+DEFAULT_LINKS = 20
+DEFAULT_PAGE_KB = 20
+WORDS = "ator nuvria verchix capriyeti gazette arcanum ritual dragon creed bestiary sklynd aunea fylott crystal waters".split()
+
+
+def synthetic_page(number, pages, links, page_kb, seed=0):
+    """
+    Page /p<number> of a generated site: about page_kb kilobytes of text and
+    `links` links to random pages, always including the next page so that
+    every page can be reached from the home page.
+    """
+    rng = random.Random(seed * 1000003 + number)
+    targets = {(number + 1) % pages} | {rng.randrange(pages) for _ in range(links - 1)}
+    anchors = "".join(f'<li><a href="/p{target}">Page {target}</a></li>' for target in sorted(targets))
+    paragraphs = []
+    size = 0
+    while size < page_kb * 1024:
+        paragraph = " ".join(rng.choice(WORDS) for _ in range(80))
+        paragraphs.append(f"<p>{paragraph}</p>")
+        size += len(paragraph) + 7
+    return (
+        f"<!DOCTYPE html><html><head><title>Page {number}</title></head><body>"
+        f"<nav><ul>{anchors}</ul></nav><article><h1>Page {number}</h1>{''.join(paragraphs)}</article>"
+        "</body></html>"
+    )
+
+
+class SiteServer:
+    """
+    A stand-in for the live site on a free local port, serving either the
+    archived pages or a generated site, with an optional delay per request.
+    """
+
+    def __init__(self, pages_dir=None, synthetic_pages=DEFAULT_SYNTHETIC_PAGES, links=DEFAULT_LINKS,
+                 page_kb=DEFAULT_PAGE_KB, latency_ms=0, seed=0):
+        self.pages_dir = pages_dir
+        self.synthetic_pages = synthetic_pages
+        self.links = links
+        self.page_kb = page_kb
+        self.latency = latency_ms / 1000.0
+        self.seed = seed
+        self.requests = 0
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                body = server.page(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                body = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def page(self, path):
+        """The HTML served for a request path, or None for a 404."""
+        if self.pages_dir is not None:
+            filename = url_to_filename(self.url + path, self.pages_dir)
+            if not os.path.exists(filename):
+                return None
+            return load_html(filename).replace(SITE_ORIGIN, self.url)
+
+        path = path.split("?")[0].strip("/")
+        if not path:
+            number = 0
+        elif path.startswith("p") and path[1:].isdigit() and int(path[1:]) < self.synthetic_pages:
+            number = int(path[1:])
+        else:
+            return None
+        return synthetic_page(number, self.synthetic_pages, self.links, self.page_kb, self.seed)
+
+    def expected_pages(self):
+        """How many distinct pages a complete crawl should archive, if known."""
+        return None if self.pages_dir is not None else self.synthetic_pages
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(log_file, elapsed):
+    """Reads a crawl's output.jsonl into a report of its throughput and where the time went."""
+    pages = []
+    end = {}
+    with open(log_file, "r", encoding="utf-8") as f:
+        for line in f:
+            event = json.loads(line)
+            if event["event"] == "page":
+                pages.append(event)
+            elif event["event"] == "end":
+                end = event
+
+    results = {}
+    for page in pages:
+        results[page.get("result", "fetched")] = results.get(page.get("result", "fetched"), 0) + 1
+
+    timings = {}
+    for field in ("fetch_ms", "render_ms", "dedup_ms", "parse_ms", "save_ms", "total_ms"):
+        values = [page[field] for page in pages if field in page]
+        timings[field] = {
+            "pages": len(values),
+            "sum": round(sum(values), 1),
+            "mean": round(sum(values) / len(values), 2) if values else 0.0,
+            "p50": percentile(values, 0.5),
+            "p95": percentile(values, 0.95),
+        }
+
+    return {
+        "pages": len(pages),
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(len(pages) / elapsed, 1) if elapsed else 0.0,
+        "results": results,
+        "states": end.get("states", {}),
+        "timings": timings,
+    }
+
+
+def run_crawler(start_url, work_dir, crawler_args):
+    """Runs bruteForceArchive.py in work_dir against start_url. Returns (seconds, exit status)."""
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, CRAWLER, *crawler_args],
+        input=start_url + "\n",
+        cwd=work_dir,
+        text=True,
+        stdout=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start, process.returncode
+
+
+def benchmark(server, crawler_args=(), keep=False):
+    """Crawls the server's site from scratch in a temporary directory and reports on the run."""
+    work_dir = tempfile.mkdtemp(prefix="crawl-benchmark-")
+    try:
+        with server:
+            elapsed, status = run_crawler(server.url, work_dir, list(crawler_args))
+            requests = server.requests
+        report = summarize(os.path.join(work_dir, "output.jsonl"), elapsed)
+        report["exit_status"] = status
+        report["requests"] = requests
+        report["expected_pages"] = server.expected_pages()
+        # ru_maxrss of the finished crawler, in kilobytes on Linux.
+        report["peak_memory_mb"] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1) if resource else None
+        report["work_dir"] = work_dir if keep else None
+        return report
+    finally:
+        if not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def print_report(report):
+    print(f"Crawled {report['pages']} pages in {report['seconds']:.2f}s: {report['pages_per_second']} pages/s "
+          f"({report['requests']} requests served)")
+    print("Results: " + ", ".join(f"{count} {result}" for result, count in sorted(report["results"].items())))
+    if report["expected_pages"] is not None:
+        print(f"Archived {report['results'].get('written', 0)} of {report['expected_pages']} pages")
+    print(f"Peak crawler memory: {report['peak_memory_mb']} MB" if report["peak_memory_mb"] is not None else "Peak crawler memory: n/a")
+    print(f"\n{'':10} {'pages':>6} {'total ms':>10} {'mean':>8} {'p50':>8} {'p95':>8}")
+    for field, timing in report["timings"].items():
+        if timing["pages"]:
+            print(f"{field[:-3]:10} {timing['pages']:>6} {timing['sum']:>10.1f} {timing['mean']:>8.2f} "
+                  f"{timing['p50']:>8.1f} {timing['p95']:>8.1f}")
+    if report["work_dir"]:
+        print(f"\nCrawl output kept in {report['work_dir']}")
+
+
+# Example Usage:
+# python crawlBenchmark.py
+# python crawlBenchmark.py --synthetic 2000 --links 40 --latency 20 -- --concurrency 32 --parser lxml
+# python crawlBenchmark.py --pages crawled_pages --json before.json
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Benchmark bruteForceArchive.py offline: serve a site from a local HTTP server,\n"
+            "crawl it from scratch and report pages/s, fetch/render/parse/save times and peak memory.\n"
+            "Arguments after -- are passed to the crawler."
+        ),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--pages", nargs="?", const=DEFAULT_PAGES_DIR, help=f"Serve saved pages (default directory: {DEFAULT_PAGES_DIR})")
+    source.add_argument(
+        "--synthetic",
+        type=int,
+        metavar="PAGES",
+        default=DEFAULT_SYNTHETIC_PAGES,
+        help=f"Serve a generated site of this many pages (default: {DEFAULT_SYNTHETIC_PAGES})"
+    )
+    parser.add_argument("--links", type=int, default=DEFAULT_LINKS, help=f"Links per generated page (default: {DEFAULT_LINKS})")
+    parser.add_argument("--page-kb", type=int, default=DEFAULT_PAGE_KB, help=f"Text per generated page in KB (default: {DEFAULT_PAGE_KB})")
+    parser.add_argument("--latency", type=float, default=0, help="Delay added to every response, in ms (default: 0)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated site (default: 0)")
+    parser.add_argument("--json", help="Also write the report to this file, to compare runs")
+    parser.add_argument("--keep", action="store_true", help="Keep the crawl's output directory")
+    parser.add_argument("crawler_args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    crawler_args = args.crawler_args[1:] if args.crawler_args[:1] == ["--"] else args.crawler_args
+
+    server = SiteServer(args.pages, args.synthetic, args.links, args.page_kb, args.latency, args.seed)
+    report = benchmark(server, crawler_args, args.keep)
+    report["crawler_args"] = crawler_args
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    expected = report["expected_pages"]
+    sys.exit(1 if report["exit_status"] or (expected is not None and report["results"].get("written", 0) != expected) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import sqlite3
+import hashlib
+from datetime import datetime, timezone
+
+DEFAULT_STORE = "crawl.db"
+
+# Changes are committed to disk once this many pages have been processed, and when the store is closed.
+COMMIT_EVERY = 50
+
+# Failed URLs are retried by later runs until they have failed this many times.
+MAX_RETRIES = 3
+
+# Frontier states of a URL.
+QUEUED = "queued"
+FETCHED = "fetched"
+FAILED = "failed"
+DUPLICATE = "duplicate"
+# Fetched, but not an HTML page (a PDF, an image, ...); never retried.
+SKIPPED = "skipped"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    filename TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    sha256 TEXT,
+    fetched_at TEXT
+);
+CREATE TABLE IF NOT EXISTS frontier (
+    url TEXT PRIMARY KEY,
+    parent TEXT,
+    state TEXT NOT NULL,
+    retries INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    fingerprint TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS frontier_state ON frontier (state);
+CREATE TABLE IF NOT EXISTS assets (
+    url TEXT PRIMARY KEY,
+    digest TEXT,
+    path TEXT,
+    content_type TEXT,
+    error TEXT,
+    fetched_at TEXT
+);
+"""
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def content_hash(content):
+    """SHA-256 of a page's HTML."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class CrawlStore:
+    """
+    Persistent record of every archived page: the file it was saved to, the
+    ETag/Last-Modified validators the server sent, and a hash of its content.
+    Re-crawls use it to send conditional requests and to leave files whose
+    content has not changed untouched.
+
+    It also holds the crawl frontier: every URL found by the current crawl,
+    with its state (queued, fetched, failed or duplicate) and retry count, so
+    an interrupted crawl can carry on where it stopped, and the assets (images,
+    stylesheets, fonts, scripts) downloaded for offline snapshots.
+
+    Changes are committed in batches by checkpoint(). A page's updates are made
+    together between checkpoints, so a crash loses at most the last batch of
+    pages, which are simply fetched again.
+    """
+
+    def __init__(self, path=DEFAULT_STORE):
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        self.pending = 0
+
+    def get(self, url):
+        """The stored record for a URL, or None if it has never been archived."""
+        return self.connection.execute("SELECT * FROM pages WHERE url = ?", (url,)).fetchone()
+
+    def record(self, url, filename, etag, last_modified, sha256):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO pages (url, filename, etag, last_modified, sha256, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (url, filename, etag, last_modified, sha256, _now())
+        )
+
+    def archived_urls(self):
+        """Every page URL that has been archived, in URL order."""
+        return [row["url"] for row in self.connection.execute("SELECT url FROM pages ORDER BY url")]
+
+    def asset(self, url):
+        """The stored record for an asset URL, or None if it has never been downloaded."""
+        return self.connection.execute("SELECT * FROM assets WHERE url = ?", (url,)).fetchone()
+
+    def record_asset(self, url, digest, path, content_type, error=None):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO assets (url, digest, path, content_type, error, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (url, digest, path, content_type, error, _now())
+        )
+
+    def frontier_root(self):
+        """The start URL of the crawl recorded in the frontier, or None."""
+        row = self.connection.execute("SELECT url FROM frontier WHERE parent IS NULL").fetchone()
+        return row["url"] if row else None
+
+    def reset_frontier(self, start_url):
+        """Begin a new crawl from start_url, forgetting the previous frontier."""
+        self.connection.execute("DELETE FROM frontier")
+        self.connection.execute(
+            "INSERT INTO frontier (url, parent, state, updated_at) VALUES (?, NULL, ?, ?)", (start_url, QUEUED, _now())
+        )
+        self.commit()
+
+    def requeue_failed(self, max_retries=MAX_RETRIES):
+        """Queue the failed URLs that have not yet used up their retries. Returns how many."""
+        cursor = self.connection.execute(
+            "UPDATE frontier SET state = ?, updated_at = ? WHERE state = ? AND retries < ?",
+            (QUEUED, _now(), FAILED, max_retries)
+        )
+        self.commit()
+        return cursor.rowcount
+
+    def enqueue(self, url, parent):
+        """Add a newly found URL to the frontier, unless it is already known."""
+        self.connection.execute(
+            "INSERT OR IGNORE INTO frontier (url, parent, state, updated_at) VALUES (?, ?, ?, ?)",
+            (url, parent, QUEUED, _now())
+        )
+
+    def mark(self, url, state, error=None, fingerprint=None):
+        """Set a URL's frontier state; marking it failed also counts a retry."""
+        self.connection.execute(
+            "UPDATE frontier SET state = ?, error = ?, fingerprint = COALESCE(?, fingerprint), "
+            "retries = retries + ?, updated_at = ? WHERE url = ?",
+            (state, error, None if fingerprint is None else format(fingerprint, "016x"),
+             1 if state == FAILED else 0, _now(), url)
+        )
+
+    def queued(self):
+        """The (url, parent) pairs still waiting to be fetched, in the order they were found."""
+        rows = self.connection.execute(
+            "SELECT url, COALESCE(parent, 'Root') AS parent FROM frontier WHERE state = ? ORDER BY rowid", (QUEUED,)
+        )
+        return [(row["url"], row["parent"]) for row in rows]
+
+    def failed(self):
+        """The URLs of the current crawl that failed, with their errors."""
+        rows = self.connection.execute("SELECT url, error FROM frontier WHERE state = ?", (FAILED,))
+        return {row["url"]: row["error"] for row in rows}
+
+    def known_urls(self):
+        return {row["url"] for row in self.connection.execute("SELECT url FROM frontier")}
+
+    def fingerprints(self):
+        """The (url, fingerprint) of every page archived so far by the current crawl."""
+        rows = self.connection.execute("SELECT url, fingerprint FROM frontier WHERE fingerprint IS NOT NULL")
+        return [(row["url"], int(row["fingerprint"], 16)) for row in rows]
+
+    def states(self):
+        """How many URLs of the current crawl are in each state."""
+        rows = self.connection.execute("SELECT state, COUNT(*) AS count FROM frontier GROUP BY state")
+        return {row["state"]: row["count"] for row in rows}
+
+    def checkpoint(self, before_commit=None):
+        """
+        Note that a page has been processed, committing once COMMIT_EVERY have been.
+        before_commit is called first, so whatever the store refers to can be made durable.
+        """
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            if before_commit is not None:
+                before_commit()
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
@@ -0,0 +1,160 @@
+import os
+import re
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import unquote, urldefrag, urljoin, urlparse
+from archiveStore import PackArchive, archive_pages, directory_pages
+from crawlStore import CrawlStore, DEFAULT_STORE
+from linkParsers import DEFAULT_PARSER, LINK_PARSERS, OUTDATED_PATTERNS, outdated_pattern
+from pageDedup import canonicalize_url
+
+DEFAULT_PAGES = "crawled_pages"
+PAGE_EXTENSIONS = {"", ".html", ".htm", ".php"}
+SKIPPED_SCHEMES = ("mailto:", "tel:", "javascript:", "data:")
+ANCHOR_PATTERN = re.compile(r"""\b(?:id|name)=["']?([^"'\s>]+)""", re.I)
+
+
+def page_links(job):
+    """
+    Parses one page. Returns (source, url, links, anchors): every link as a
+    (resolved URL with fragment, link text) pair, and the ids a link can jump to.
+    Runs in a worker process.
+    """
+    source, url, content, parser = job
+    find_links, link_text = LINK_PARSERS[parser]
+    links = []
+    for raw_href, link in find_links(content):
+        raw_href = raw_href.strip()
+        if not raw_href or raw_href.lower().startswith(SKIPPED_SCHEMES):
+            continue
+        resolved = urljoin(url or "", raw_href)
+        if urlparse(resolved).scheme in ("http", "https"):
+            links.append((resolved, " ".join(link_text(link).split())))
+    return source, url, links, set(ANCHOR_PATTERN.findall(content))
+
+
+def check_links(pages, parser=DEFAULT_PARSER, workers=None, outdated=None, failures=None):
+    """
+    Builds the link graph of the archived pages and checks it. Returns a report of:
+
+    - broken: links to pages the crawl failed to fetch, and links to #anchors
+      that are not on the target page, as (page, text, link, reason)
+    - missing: links to pages on the site that are not archived, as {link: [pages]}
+    - orphans: archived pages no other page links to
+    - outdated: links whose URL matches the outdated pattern, as (page, text, link)
+
+    Pages are parsed in `workers` processes.
+    """
+    failures = failures or {}
+    workers = workers or os.cpu_count() or 1
+    jobs = [(source, url, content, parser) for source, url, content in pages]
+    with ProcessPoolExecutor(workers) as pool:
+        parsed = list(pool.map(page_links, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+    anchors = {url: page_anchors for _, url, _, page_anchors in parsed if url}
+    domains = {urlparse(url).netloc for url in anchors}
+    incoming = {url: set() for url in anchors}
+    report = {"pages": len(parsed), "links": 0, "broken": [], "missing": {}, "orphans": [], "outdated": []}
+
+    for source, url, links, _ in parsed:
+        page = url or source
+        report["links"] += len(links)
+        for link, text in links:
+            if outdated is not None and outdated.search(link):
+                report["outdated"].append((page, text, link))
+
+            target, fragment = urldefrag(link)
+            target = canonicalize_url(target)
+            parts = urlparse(target)
+            if parts.netloc not in domains or os.path.splitext(parts.path)[1].lower() not in PAGE_EXTENSIONS:
+                continue
+
+            if target in anchors:
+                if target != url:
+                    incoming[target].add(page)
+                if fragment and unquote(fragment) not in anchors[target] and fragment not in anchors[target]:
+                    report["broken"].append((page, text, link, f"no anchor '#{fragment}' on the page"))
+            elif target in failures:
+                report["broken"].append((page, text, link, f"failed in the last crawl: {failures[target]}"))
+            else:
+                report["missing"].setdefault(target, []).append(page)
+
+    # The home page needs no links to it.
+    report["orphans"] = sorted(url for url, pages in incoming.items() if not pages and urlparse(url).path.strip("/"))
+    return report
+
+
+def print_report(report):
+    print(f"Checked {report['links']} links on {report['pages']} pages")
+
+    print(f"\nBroken links: {len(report['broken'])}")
+    for page, text, link, reason in report["broken"]:
+        print(f"  On page {page}: '{text}' -> {link} ({reason})")
+
+    print(f"\nLinks to pages that are not archived: {len(report['missing'])}")
+    for target, pages in sorted(report["missing"].items()):
+        print(f"  {target} (linked from {len(pages)} pages, e.g. {pages[0]})")
+
+    print(f"\nOrphan pages: {len(report['orphans'])}")
+    for url in report["orphans"]:
+        print(f"  {url}")
+
+    print(f"\nOutdated links: {len(report['outdated'])}")
+    for page, text, link in report["outdated"]:
+        print(f"  On page {page}: Outdated link '{text}' identified: {link}")
+
+
+# Example Usage:
+# python linkCheck.py
+# python linkCheck.py --archive archive --outdated atlassian --outdated "wiki\.merisyl\.com"
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Check the links between the archived pages without re-crawling: broken links,\n"
+            "links to pages that were never archived, orphan pages and outdated links.\n"
+            "Exits with status 1 if there are broken or outdated links."
+        ),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--pages", default=DEFAULT_PAGES, help=f"Directory of saved pages (default: {DEFAULT_PAGES})")
+    parser.add_argument("--archive", help="Check a pack archive (bruteForceArchive.py --archive) instead of --pages")
+    parser.add_argument("--store", default=DEFAULT_STORE, help=f"Crawl database, for the pages that failed (default: {DEFAULT_STORE})")
+    parser.add_argument(
+        "--outdated",
+        action="append",
+        metavar="PATTERN",
+        help=f"Report links whose URL matches this regular expression; may be repeated (default: {' '.join(OUTDATED_PATTERNS)})"
+    )
+    parser.add_argument("--parser", choices=sorted(LINK_PARSERS), default=DEFAULT_PARSER, help=f"HTML parser (default: {DEFAULT_PARSER})")
+    parser.add_argument("--workers", type=int, help="Processes parsing pages (default: one per CPU)")
+
+    args = parser.parse_args()
+    start = time.perf_counter()
+
+    failures = {}
+    if os.path.exists(args.store):
+        store = CrawlStore(args.store)
+        try:
+            failures = store.failed()
+        finally:
+            store.close()
+
+    outdated = outdated_pattern(args.outdated or OUTDATED_PATTERNS)
+    if args.archive:
+        archive = PackArchive(args.archive)
+        try:
+            report = check_links(archive_pages(archive), args.parser, args.workers, outdated, failures)
+        finally:
+            archive.close()
+    else:
+        report = check_links(directory_pages(args.pages), args.parser, args.workers, outdated, failures)
+
+    print_report(report)
+    print(f"\nDone in {time.perf_counter() - start:.2f}s")
+    sys.exit(1 if report["broken"] or report["outdated"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import re
+from bs4 import BeautifulSoup
+
+# Faster link parsers, used when installed.
+try:
+    import lxml.html
+    LXML_PARSER = lxml.html.HTMLParser(encoding="utf-8")
+except ImportError:
+    lxml = None
+try:
+    from selectolax.parser import HTMLParser as SelectolaxParser
+except ImportError:
+    SelectolaxParser = None
+
+# Links whose URL matches any of these (regular expressions, ignoring case) are reported as outdated.
+OUTDATED_PATTERNS = ["atlassian"]
+
+
+def links_html_parser(content):
+    """Every <a> on a page as (href, element), using BeautifulSoup's pure-Python parser."""
+    soup = BeautifulSoup(content, "html.parser")
+    return [(link.attrs.get("href", ""), link) for link in soup.find_all("a")]
+
+
+def links_lxml(content):
+    """Every <a> on a page as (href, element), using lxml's C parser."""
+    if not content.strip():
+        return []
+    document = lxml.html.document_fromstring(content.encode("utf-8"), parser=LXML_PARSER)
+    return [(link.get("href", ""), link) for link in document.iter("a")]
+
+
+def links_selectolax(content):
+    """Every <a> on a page as (href, node), using selectolax's Modest/Lexbor parser."""
+    return [(link.attributes.get("href") or "", link) for link in SelectolaxParser(content).css("a")]
+
+
+# Link parser backends: name -> (function finding the links, function giving a link's text).
+LINK_PARSERS = {"html.parser": (links_html_parser, lambda link: link.get_text())}
+if lxml is not None:
+    LINK_PARSERS["lxml"] = (links_lxml, lambda link: link.text_content())
+if SelectolaxParser is not None:
+    LINK_PARSERS["selectolax"] = (links_selectolax, lambda link: link.text())
+# The fastest parser installed.
+DEFAULT_PARSER = next(name for name in ("selectolax", "lxml", "html.parser") if name in LINK_PARSERS)
+
+
+def outdated_pattern(patterns=OUTDATED_PATTERNS):
+    """One case-insensitive regular expression matching URLs that match any of the patterns, or None if there are none."""
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns), re.I)
@@ -0,0 +1,132 @@
+import re
+import hashlib
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+# Pages whose fingerprints differ in at most this many of their 64 bits are treated as the same page.
+NEAR_DUPLICATE_BITS = 3
+FINGERPRINT_BANDS = 4
+BAND_BITS = 64 // FINGERPRINT_BANDS
+
+# The page text is taken from the first of these found, so the site's shared header,
+# menus and footer don't make every page look alike.
+CONTENT_PATTERNS = [
+    re.compile(r"<article\b.*?</article>", re.S | re.I),
+    re.compile(r"<main\b.*?</main>", re.S | re.I),
+    re.compile(r"<body\b.*?</body>", re.S | re.I),
+]
+NOISE_PATTERN = re.compile(r"<(script|style|noscript)\b.*?</\1>", re.S | re.I)
+TAG_PATTERN = re.compile(r"<[^>]+>")
+WORD_PATTERN = re.compile(r"\w+")
+CANONICAL_PATTERN = re.compile(r"<link\b[^>]*\brel=[\"']?canonical\b[^>]*>", re.I)
+HREF_PATTERN = re.compile(r"\bhref=[\"']?([^\"' >]+)", re.I)
+
+
+def collapse_repeated_segments(segments):
+    """
+    Drop immediately repeated runs of path segments, so relative links resolved
+    against the wrong base (gazette/gazette/aunea, gazette/aunea/gazette/aunea/sklynd)
+    come back to the page they meant (gazette/aunea, gazette/aunea/sklynd).
+    """
+    segments = list(segments)
+    collapsed = True
+    while collapsed:
+        collapsed = False
+        for size in range(1, len(segments) // 2 + 1):
+            for i in range(len(segments) - 2 * size + 1):
+                if segments[i:i + size] == segments[i + size:i + 2 * size]:
+                    del segments[i + size:i + 2 * size]
+                    collapsed = True
+                    break
+            if collapsed:
+                break
+    return segments
+
+
+def canonicalize_url(url):
+    """
+    Reduce a URL to one spelling per logical page: lowercase scheme and host,
+    no default port, "." and ".." resolved, repeated path segments collapsed,
+    no trailing slash, query parameters sorted, and no fragment.
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    host, _, port = netloc.rpartition(":")
+    if host and DEFAULT_PORTS.get(scheme) == port:
+        netloc = host
+
+    segments = []
+    for segment in parts.path.split("/"):
+        if segment == "..":
+            if segments:
+                segments.pop()
+        elif segment and segment != ".":
+            segments.append(segment)
+    segments = collapse_repeated_segments(segments)
+    path = "/" + "/".join(segments) if segments else ""
+
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def canonical_link(url, content):
+    """The canonicalized <link rel="canonical"> target of a page, resolved against its URL, or None."""
+    tag = CANONICAL_PATTERN.search(content)
+    if not tag:
+        return None
+    href = HREF_PATTERN.search(tag.group(0))
+    if not href:
+        return None
+    return canonicalize_url(urljoin(url, href.group(1)))
+
+
+def content_fingerprint(content):
+    """
+    64-bit SimHash of the words of a page's main content, taken in overlapping
+    runs of three. Pages with near-identical text get fingerprints a few bits apart.
+    """
+    for pattern in CONTENT_PATTERNS:
+        match = pattern.search(content)
+        if match:
+            content = match.group(0)
+            break
+    words = WORD_PATTERN.findall(TAG_PATTERN.sub(" ", NOISE_PATTERN.sub(" ", content)).lower())
+
+    weights = [0] * 64
+    for i in range(max(len(words) - 2, 1)):
+        shingle = " ".join(words[i:i + 3]).encode("utf-8")
+        value = int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+class FingerprintIndex:
+    """
+    Finds an earlier page whose fingerprint is within NEAR_DUPLICATE_BITS of a new one.
+
+    Fingerprints are filed under each of their FINGERPRINT_BANDS bands. Two
+    fingerprints that close must match exactly in at least one band, so only
+    the pages sharing a band are compared.
+    """
+
+    def __init__(self):
+        self.bands = [{} for _ in range(FINGERPRINT_BANDS)]
+
+    def _keys(self, fingerprint):
+        mask = (1 << BAND_BITS) - 1
+        return [fingerprint >> (BAND_BITS * i) & mask for i in range(FINGERPRINT_BANDS)]
+
+    def find(self, fingerprint):
+        """The URL of a near-duplicate page already added, or None."""
+        for band, key in zip(self.bands, self._keys(fingerprint)):
+            for other, url in band.get(key, ()):
+                if bin(fingerprint ^ other).count("1") <= NEAR_DUPLICATE_BITS:
+                    return url
+        return None
+
+    def add(self, fingerprint, url):
+        for band, key in zip(self.bands, self._keys(fingerprint)):
+            band.setdefault(key, []).append((fingerprint, url))
@@ -0,0 +1,196 @@
+import re
+import time
+import sqlite3
+import argparse
+from archiveStore import PackArchive, archive_pages, directory_pages
+from crawlStore import content_hash
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+    from bs4 import BeautifulSoup
+
+DEFAULT_INDEX = "search.db"
+DEFAULT_PAGES = "crawled_pages"
+DEFAULT_LIMIT = 10
+
+# bm25() weights of the title, headings and body columns: a word in the title counts for most.
+COLUMN_WEIGHTS = (10.0, 4.0, 1.0)
+SNIPPET_WORDS = 16
+
+# Page chrome that is the same on every page and would only add noise to the index.
+SKIPPED_TAGS = ["script", "style", "noscript", "template", "nav", "header", "footer", "aside", "form"]
+HEADING_TAGS = ["h1", "h2", "h3", "h4"]
+WORD_PATTERN = re.compile(r"\w+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    source TEXT UNIQUE NOT NULL,
+    url TEXT,
+    sha256 TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS text USING fts5(
+    title, headings, body, tokenize = 'porter unicode61 remove_diacritics 2'
+);
+"""
+
+
+def _collapse(text):
+    return " ".join(text.split())
+
+
+def extract_text(content):
+    """The (title, headings, body text) a reader sees on a page, without the site's menus and footer."""
+    if lxml is not None:
+        document = lxml.html.document_fromstring(content.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8"))
+        title = document.findtext(".//title") or ""
+        for element in list(document.iter(*SKIPPED_TAGS)):
+            element.drop_tree()
+        # lxml elements without children are falsy, so test for None.
+        main = next(document.iter("article"), None)
+        if main is None:
+            main = next(document.iter("main"), None)
+        if main is None:
+            main = document
+        headings = [" ".join(element.itertext()) for element in main.iter(*HEADING_TAGS)]
+        body = " ".join(main.itertext())
+    else:
+        soup = BeautifulSoup(content, "html.parser")
+        title = soup.title.get_text() if soup.title else ""
+        for element in soup.find_all(SKIPPED_TAGS):
+            element.decompose()
+        main = soup.find("article") or soup.find("main") or soup
+        headings = [element.get_text(" ") for element in main.find_all(HEADING_TAGS)]
+        body = main.get_text(" ")
+    return _collapse(title), " | ".join(_collapse(h) for h in headings), _collapse(body)
+
+
+class SearchIndex:
+    """
+    Full-text index of the archived pages, kept in an SQLite FTS5 table.
+
+    Each page is indexed with its content hash. update() re-extracts only the
+    pages whose content has changed since the last build and drops pages that
+    are no longer archived, so rebuilding after a re-crawl is quick.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def update(self, pages):
+        """Brings the index up to date with (source, url, html) pages. Returns (added, changed, removed)."""
+        known = dict(self.connection.execute("SELECT source, sha256 FROM documents"))
+        added = changed = 0
+        seen = set()
+        for source, url, content in pages:
+            seen.add(source)
+            digest = content_hash(content)
+            if known.get(source) == digest:
+                continue
+            if source in known:
+                self.remove(source)
+                changed += 1
+            else:
+                added += 1
+            cursor = self.connection.execute(
+                "INSERT INTO documents (source, url, sha256) VALUES (?, ?, ?)", (source, url, digest)
+            )
+            self.connection.execute(
+                "INSERT INTO text (rowid, title, headings, body) VALUES (?, ?, ?, ?)",
+                (cursor.lastrowid, *extract_text(content))
+            )
+
+        removed = set(known) - seen
+        for source in removed:
+            self.remove(source)
+        self.connection.execute("INSERT INTO text (text) VALUES ('optimize')")
+        self.connection.commit()
+        return added, changed, len(removed)
+
+    def remove(self, source):
+        row = self.connection.execute("SELECT id FROM documents WHERE source = ?", (source,)).fetchone()
+        if row is not None:
+            self.connection.execute("DELETE FROM text WHERE rowid = ?", row)
+            self.connection.execute("DELETE FROM documents WHERE id = ?", row)
+
+    def search(self, query, limit=DEFAULT_LIMIT, match_any=False):
+        """
+        The best matching pages for the words of a query, as (score, title, url or
+        file, snippet) tuples, best first. Every word must appear unless match_any.
+        The last word also matches as a prefix, so partial names still find pages.
+        """
+        words = WORD_PATTERN.findall(query)
+        if not words:
+            return []
+        terms = [f'"{word}"' for word in words]
+        terms[-1] += "*"
+        expression = (" OR " if match_any else " ").join(terms)
+
+        weights = ", ".join(str(weight) for weight in COLUMN_WEIGHTS)
+        rows = self.connection.execute(
+            f"SELECT bm25(text, {weights}) AS rank, text.title, COALESCE(documents.url, documents.source), "
+            f"snippet(text, 2, '[', ']', '...', {SNIPPET_WORDS}) "
+            "FROM text JOIN documents ON documents.id = text.rowid "
+            "WHERE text MATCH ? ORDER BY rank LIMIT ?",
+            (expression, limit)
+        )
+        # bm25() is lower for better matches; flip it so higher scores are better.
+        return [(-rank, title, location, snippet) for rank, title, location, snippet in rows]
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+
+# Example Usage:
+# python pageSearch.py build
+# python pageSearch.py build --archive archive
+# python pageSearch.py query "ator sun"
+# python pageSearch.py query --any capriyeti yeti -n 5
+def main():
+    parser = argparse.ArgumentParser(description="Build and query a full-text index of the archived pages.")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help=f"Index database (default: {DEFAULT_INDEX})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Index new and changed pages and drop removed ones")
+    build.add_argument("--pages", default=DEFAULT_PAGES, help=f"Directory of saved pages (default: {DEFAULT_PAGES})")
+    build.add_argument("--archive", help="Index a pack archive (bruteForceArchive.py --archive) instead of --pages")
+
+    query = commands.add_parser("query", help="Print the pages that best match some words")
+    query.add_argument("words", nargs="+")
+    query.add_argument("-n", "--limit", type=int, default=DEFAULT_LIMIT, help=f"Results shown (default: {DEFAULT_LIMIT})")
+    query.add_argument("--any", action="store_true", help="Match pages with any of the words instead of all")
+
+    args = parser.parse_args()
+    index = SearchIndex(args.index)
+    try:
+        if args.command == "build":
+            start = time.perf_counter()
+            if args.archive:
+                archive = PackArchive(args.archive)
+                try:
+                    added, changed, removed = index.update(archive_pages(archive))
+                finally:
+                    archive.close()
+            else:
+                added, changed, removed = index.update(directory_pages(args.pages))
+            print(f"Indexed {index.count()} pages ({added} added, {changed} changed, {removed} removed) "
+                  f"in {time.perf_counter() - start:.2f}s")
+        elif args.command == "query":
+            start = time.perf_counter()
+            results = index.search(" ".join(args.words), args.limit, args.any)
+            elapsed = (time.perf_counter() - start) * 1000
+            for score, title, location, snippet in results:
+                print(f"{score:6.2f}  {title}\n        {location}\n        {snippet}")
+            print(f"{len(results)} results in {elapsed:.1f} ms")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()